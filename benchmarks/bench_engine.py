@@ -0,0 +1,243 @@
+"""
+Throughput benchmark for the Hash Verifier hashing engine.
+
+Generates synthetic files, hashes them with every combination of read
+backend, block size and algorithm selection, and writes the results as JSON.
+When a baseline is given, any case that got slower than the tolerance allows
+is reported and the script exits with status 1.
+
+Usage:
+    python benchmarks/bench_engine.py --sizes 64M,512M --output results.json
+    python benchmarks/bench_engine.py --baseline results.json
+
+Files are hashed right after being written, so by default the numbers show
+engine and CPU throughput from the page cache. On Linux, --cold drops each
+file from the page cache before every run to include disk reads.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hash_engine
+import hash_tuner
+
+# Constants
+DEFAULT_SIZES = "64M"
+DEFAULT_KINDS = "random,zeros,sparse"
+DEFAULT_BLOCK_SIZES = "64K,1M"
+DEFAULT_IO_POLICIES = "normal"
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.10  # Allowed slowdown against the baseline
+SEED = 20240101  # Fixed so every run hashes the same bytes
+WRITE_CHUNK = 1024 * 1024
+
+
+def generate_file(path, kind, size):
+    """
+    Write a synthetic test file.
+
+    :param path: Destination path
+    :param kind: "random" (incompressible), "zeros" or "sparse" (mostly holes)
+    :param size: File size in bytes
+    """
+    rng = random.Random(SEED)
+    with open(path, 'wb') as f:
+        if kind == "sparse":
+            # One data block every 64 MB, the rest is left as holes
+            for offset in range(0, size, 64 * WRITE_CHUNK):
+                f.seek(offset)
+                f.write(rng.randbytes(min(WRITE_CHUNK, size - offset)))
+            f.truncate(size)
+            return
+
+        zeros = bytes(WRITE_CHUNK)
+        remaining = size
+        while remaining > 0:
+            n = min(WRITE_CHUNK, remaining)
+            f.write(rng.randbytes(n) if kind == "random" else zeros[:n])
+            remaining -= n
+
+
+def drop_from_cache(path):
+    """Ask the kernel to forget the cached pages of a file, if supported."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def measure(path, algorithms, backend, block_size, repeat, cold, io_policy="normal"):
+    """
+    Hash a file several times and keep the median duration.
+
+    :return: Median duration in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            drop_from_cache(path)
+        start = time.perf_counter()
+        hash_engine.hash_file(path, algorithms, buffer_size=block_size, backend=backend, io_policy=io_policy)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def iter_cases(kinds, sizes, block_sizes, io_policies=("normal",)):
+    """Yield (file label, kind, size, backend, block size, I/O policy, algorithm label, algorithms)."""
+    selections = [(algo, [algo]) for algo in hash_engine.ALGORITHMS]
+    selections.append(("default", list(hash_engine.DEFAULT_ALGORITHMS)))
+
+    for kind in kinds:
+        for size in sizes:
+            label = f"{kind}-{size // (1024 * 1024)}M"
+            for backend in ("readinto", "mmap"):
+                # Mapped files are sliced, so the block size barely matters there
+                for block_size in (block_sizes if backend == "readinto" else block_sizes[:1]):
+                    # I/O policies only apply to reads, not to mapped files
+                    for io_policy in (io_policies if backend == "readinto" else ("normal",)):
+                        for algo_label, algorithms in selections:
+                            yield label, kind, size, backend, block_size, io_policy, algo_label, algorithms
+
+
+def run(args):
+    """
+    Run every benchmark case.
+
+    :param args: Parsed command-line arguments
+    :return: Result document
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="hashbench-", dir=args.workdir) as workdir:
+        generated = {}
+        for label, kind, size, backend, block_size, io_policy, algo_label, algorithms in iter_cases(
+                args.kinds, args.sizes, args.block_sizes, args.io_policies):
+            if label not in generated:
+                generated[label] = os.path.join(workdir, label)
+                generate_file(generated[label], kind, size)
+
+            seconds = measure(generated[label], algorithms, backend, block_size, args.repeat, args.cold, io_policy)
+            mb_per_s = size / seconds / (1024 * 1024) if seconds else 0.0
+            # Cases with the normal policy keep their old names so baselines still compare
+            suffix = "" if io_policy == "normal" else f"/{io_policy}"
+            results.append({
+                "case": f"{label}/{backend}/{block_size}/{algo_label}{suffix}",
+                "file": label,
+                "backend": backend,
+                "block_size": block_size,
+                "io_policy": io_policy,
+                "algorithms": algo_label,
+                "bytes": size,
+                "seconds": round(seconds, 6),
+                "mb_per_s": round(mb_per_s, 2),
+            })
+            print(f"{results[-1]['case']:<48} {mb_per_s:10.1f} MB/s", file=sys.stderr)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "cold": args.cold,
+            "repeat": args.repeat,
+            "created": int(time.time()),
+        },
+        "results": results,
+    }
+
+
+def compare(document, baseline, tolerance):
+    """
+    Find cases that got slower than the baseline allows.
+
+    :param document: Result document of this run
+    :param baseline: Result document to compare against
+    :param tolerance: Allowed relative slowdown, e.g. 0.1 for 10%
+    :return: List of human readable regression descriptions
+    """
+    previous = {entry["case"]: entry["mb_per_s"] for entry in baseline["results"]}
+    regressions = []
+    for entry in document["results"]:
+        before = previous.get(entry["case"])
+        if before and entry["mb_per_s"] < before * (1 - tolerance):
+            change = (entry["mb_per_s"] / before - 1) * 100
+            regressions.append(
+                f"{entry['case']}: {entry['mb_per_s']:.1f} MB/s vs {before:.1f} MB/s ({change:+.1f}%)"
+            )
+    return regressions
+
+
+def parse_list(value, convert=str):
+    return [convert(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Hash Verifier hashing engine.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+        type=lambda v: parse_list(v, hash_tuner.parse_block_size),
+        help=f"comma separated file sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--kinds", default=DEFAULT_KINDS, type=parse_list,
+        help=f"comma separated file kinds (default: {DEFAULT_KINDS})")
+    parser.add_argument("--block-sizes", default=DEFAULT_BLOCK_SIZES,
+        type=lambda v: parse_list(v, hash_tuner.parse_block_size),
+        help=f"comma separated readinto block sizes (default: {DEFAULT_BLOCK_SIZES})")
+    parser.add_argument("--io-policies", default=DEFAULT_IO_POLICIES, type=parse_list,
+        help=f"comma separated I/O policies for readinto cases (default: {DEFAULT_IO_POLICIES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+        help=f"runs per case, the median is kept (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--cold", action="store_true",
+        help="drop files from the page cache before every run (Linux)")
+    parser.add_argument("--workdir", default=None,
+        help="directory for the generated files (default: system temp)")
+    parser.add_argument("--output", default=None,
+        help="write the JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", default=None,
+        help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help=f"allowed slowdown against the baseline (default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+
+    for kind in args.kinds:
+        if kind not in ("random", "zeros", "sparse"):
+            parser.error(f"unknown file kind: {kind}")
+    for io_policy in args.io_policies:
+        if io_policy not in hash_engine.IO_POLICIES:
+            parser.error(f"unknown I/O policy: {io_policy}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    document = run(args)
+
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if baseline:
+        regressions = compare(document, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print(f"\nNo regressions against {args.baseline}", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
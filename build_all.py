@@ -47,7 +47,7 @@ def main():
             shutil.rmtree(folder)
             print(f"  Removed {folder}/")
     
-    for spec_file in ['HashVerifier.spec', 'install.spec', 'uninstall.spec']:
+    for spec_file in ['HashVerifier.spec', 'hashverify.spec', 'install.spec', 'uninstall.spec']:
         if os.path.exists(spec_file):
             os.remove(spec_file)
             print(f"  Removed {spec_file}")
@@ -57,6 +57,11 @@ def main():
         "Building HashVerifier.exe"
     )
     
+    run_command(
+        "pyinstaller --onefile --console --name hashverify --clean hash_cli.py",
+        "Building hashverify.exe"
+    )
+    
     run_command(
         "pyinstaller --onefile --windowed --name install --clean installer.py",
         "Building install.exe"
@@ -72,10 +77,11 @@ def main():
     print("="*60)
     print("\nYour executables are in the 'dist' folder:")
     print("  - HashVerifier.exe (~15 MB)")
+    print("  - hashverify.exe (~8 MB, command line)")
     print("  - install.exe (~10 MB)")
     print("  - uninstall.exe (~10 MB)")
     print("\nTo distribute:")
-    print("  1. Copy all 3 .exe files to a folder")
+    print("  1. Copy all .exe files to a folder")
     print("  2. Zip them up")
     print("  3. Users run install.exe to add context menu")
     print("\nDone! 🎉")
@@ -0,0 +1,170 @@
+"""
+Hashing of archive members for Hash Verifier, without extracting them.
+
+Every member of a zip, tar, tar.gz, tar.bz2 or tar.xz archive is streamed
+straight from the archive through hash_engine.hash_stream, so verifying a
+member of a multi-gigabyte release archive needs no temporary copy.
+
+Zip members are stored independently and can be read in any order: each
+worker thread opens the archive once and hashes whole members, and
+decompression and hashing release the GIL. A compressed tar is one
+continuous stream, so its members are hashed one after another while it
+is read front to back.
+"""
+import os
+import lzma
+import zlib
+import tarfile
+import zipfile
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import hash_engine
+
+# Constants
+MEMBERS_PER_WORKER = 4  # Zip members submitted ahead per worker thread
+
+MemberResult = collections.namedtuple("MemberResult", "name size hashes error")
+
+# Errors raised while reading a damaged, encrypted or unsupported member
+MEMBER_ERRORS = (OSError, EOFError, RuntimeError, NotImplementedError, zipfile.BadZipFile,
+                 tarfile.TarError, zlib.error, lzma.LZMAError)
+
+
+def archive_kind(path):
+    """
+    Tell which kind of archive a file is from its contents.
+
+    :param path: Path of the archive
+    :return: "zip", "tar", or None if it is neither
+    """
+    if zipfile.is_zipfile(path):
+        return "zip"
+    try:
+        if tarfile.is_tarfile(path):
+            return "tar"
+    except (OSError, tarfile.TarError, EOFError, zlib.error, lzma.LZMAError):
+        pass
+    return None
+
+
+def _error(e):
+    return e.strerror if isinstance(e, OSError) and e.strerror else str(e) or type(e).__name__
+
+
+class _ZipReader:
+    """Per-thread ZipFile handles, so members are read without sharing a file position."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def hash_member(self, info, algorithms, buffer_size):
+        archive = getattr(self.local, "archive", None)
+        if archive is None:
+            archive = self.local.archive = zipfile.ZipFile(self.path)
+            with self.lock:
+                self.opened.append(archive)
+        try:
+            with archive.open(info) as stream:
+                hashes = hash_engine.hash_stream(stream, algorithms, buffer_size=buffer_size, total=info.file_size)
+            return MemberResult(member_name(info.filename), info.file_size, hashes, None)
+        except MEMBER_ERRORS as e:
+            return MemberResult(member_name(info.filename), info.file_size, None, _error(e))
+
+    def close(self):
+        for archive in self.opened:
+            archive.close()
+
+
+def member_name(name):
+    """Name of a member without the ``./`` prefix that tar often adds."""
+    while name.startswith("./"):
+        name = name[2:]
+    return name
+
+
+def _wanted(name, members):
+    return members is None or member_name(name) in members
+
+
+def hash_zip(path, algorithms=None, members=None, workers=None, buffer_size=hash_engine.BUFFER_SIZE):
+    """
+    Hash the members of a zip archive in parallel.
+
+    :param path: Path of the archive
+    :param algorithms: Algorithm names to compute (default: DEFAULT_ALGORITHMS)
+    :param members: Optional set of member names (see member_name) to hash, all files otherwise
+    :param workers: Number of worker threads (default: CPU count)
+    :param buffer_size: Size of each read in bytes
+    :return: Iterator of MemberResult in archive order
+    """
+    workers = workers or os.cpu_count() or 1
+    with zipfile.ZipFile(path) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir() and _wanted(info.filename, members)]
+
+    reader = _ZipReader(path)
+    pending = collections.deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                for info in infos:
+                    pending.append(pool.submit(reader.hash_member, info, algorithms, buffer_size))
+                    if len(pending) >= workers * MEMBERS_PER_WORKER:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()  # Stopped early; do not wait for members nobody asked for
+    finally:
+        reader.close()
+
+
+def hash_tar(path, algorithms=None, members=None, buffer_size=hash_engine.BUFFER_SIZE):
+    """
+    Hash the regular file members of a (possibly compressed) tar archive.
+
+    The archive is read once as a stream, whatever its compression.
+
+    :param path: Path of the archive
+    :param algorithms: Algorithm names to compute (default: DEFAULT_ALGORITHMS)
+    :param members: Optional set of member names (see member_name) to hash, all files otherwise
+    :param buffer_size: Size of each read in bytes
+    :return: Iterator of MemberResult in archive order
+    """
+    with tarfile.open(path, "r|*") as archive:
+        for info in archive:
+            if not info.isfile() or not _wanted(info.name, members):
+                continue
+            try:
+                stream = archive.extractfile(info)
+                hashes = hash_engine.hash_stream(stream, algorithms, buffer_size=buffer_size, total=info.size)
+                yield MemberResult(member_name(info.name), info.size, hashes, None)
+            except MEMBER_ERRORS as e:
+                yield MemberResult(member_name(info.name), info.size, None, _error(e))
+                return  # The stream position is lost, later members cannot be found
+
+
+def hash_archive(path, algorithms=None, members=None, workers=None, buffer_size=hash_engine.BUFFER_SIZE):
+    """
+    Hash the members of a zip or tar archive.
+
+    :param path: Path of the archive
+    :param algorithms: Algorithm names to compute (default: DEFAULT_ALGORITHMS)
+    :param members: Optional iterable of member names to hash, all files otherwise
+    :param workers: Number of worker threads for zip archives (default: CPU count)
+    :param buffer_size: Size of each read in bytes
+    :return: Iterator of MemberResult in archive order
+    :raise ValueError: If the file is not a supported archive
+    """
+    members = {member_name(name) for name in members} if members is not None else None
+    kind = archive_kind(path)
+    if kind == "zip":
+        return hash_zip(path, algorithms, members, workers, buffer_size)
+    if kind == "tar":
+        return hash_tar(path, algorithms, members, buffer_size)
+    raise ValueError("not a zip or tar archive")
@@ -0,0 +1,277 @@
+"""
+Batch hashing of directory trees for Hash Verifier.
+
+Files are discovered lazily, grouped into batches so that many small files
+share one round trip to a worker process, and hashed across a process pool
+with a reader limit per device (see hash_scheduler). Results come back in
+discovery order and are written to checksum manifests line by line, so
+memory use does not grow with the number of files.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import hash_engine
+import hash_profile
+import hash_scheduler
+import hash_tuner
+
+# Constants
+BATCH_BYTES = 8 * 1024 * 1024  # Files are grouped until a batch holds this much data
+BATCH_FILES = 256  # ...or this many files
+BATCHES_PER_WORKER = 2  # Batches kept in flight per worker process
+SCHEDULE_WINDOW = 4096  # Files read ahead of the results for scheduling
+
+
+def iter_files(paths):
+    """
+    Yield every regular file below the given paths in a stable order.
+
+    Directories are walked recursively without following symlinks to other
+    directories. Plain files are yielded as given.
+
+    :param paths: Files and directories to walk
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            yield from _walk(path)
+        else:
+            yield path
+
+
+def _walk(directory):
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        return
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path)
+            elif entry.is_file():
+                yield entry.path
+        except OSError:
+            continue
+
+
+def _hash_batch(batch, backend, block_size, io_policy=None, profile=False):
+    """Worker entry point: hash every file of a batch, with its profile summary if requested."""
+    results = []
+    for filepath, algorithms, decompress in batch:
+        timings = hash_profile.HashProfile() if profile else None
+        try:
+            # Devices were probed by the parent, see _admit
+            file_backend, buffer_size = hash_tuner.read_plan(filepath, backend, block_size, probe=False)
+            hashes = hash_engine.hash_file(filepath, algorithms, backend=file_backend, buffer_size=buffer_size,
+                io_policy=io_policy, profile=timings, decompress=decompress)
+            results.append((filepath, hashes, None, timings and timings.as_dict()))
+        except OSError as e:
+            results.append((filepath, None, e.strerror or str(e), None))
+    return results
+
+
+def _admit(scheduler, seq, job, cache, decompress, block_size):
+    """Queue a job, or return its result right away if it needs no reading."""
+    filepath, algorithms, *flag = job
+    decompress = flag[0] if flag else decompress
+    try:
+        st = os.stat(filepath)
+    except OSError as e:
+        return filepath, None, e.strerror or str(e)
+
+    # The cache holds digests of files as stored, not of their payload
+    cached = cache.lookup(filepath, algorithms, st) if cache and not decompress else {}
+    if len(cached) == len(algorithms):
+        return filepath, cached, None
+    if not block_size:
+        hash_tuner.prepare(filepath, st)
+    scheduler.add(st, seq, ((filepath, algorithms, decompress), st))
+    return None
+
+
+def hash_jobs(jobs, workers=None, backend=None, block_size=None, cache=None, io_policy=None, readers=None,
+              profiles=None, decompress=False):
+    """
+    Hash many files across a process pool, each with its own algorithms.
+
+    Jobs are read ahead in a window of SCHEDULE_WINDOW files, which
+    hash_scheduler spreads over the devices they live on: each device
+    only gets as many batches at once as its reader limit allows, in inode
+    order, while the workers stay busy with files from other devices.
+    Results are put back into input order before they are yielded, so
+    arbitrarily long job lists can be streamed.
+
+    :param jobs: Iterable of (filepath, algorithms) or (filepath, algorithms, decompress) tuples
+    :param workers: Number of worker processes (default: CPU count)
+    :param backend: Read backend passed to hash_engine.hash_file
+    :param block_size: Read block size, or None to use hash_tuner. Devices are
+                       probed here, before their files reach the workers.
+    :param cache: Optional hash_cache.DigestCache consulted before hashing
+    :param io_policy: Page cache policy passed to hash_engine.hash_file
+    :param readers: Dictionary overriding hash_scheduler.DEFAULT_READERS per device kind
+    :param profiles: Optional list that receives (filepath, hash_profile summary)
+                     for every file that was read, in completion order
+    :param decompress: Hash the decompressed payload of compressed files, for
+                       jobs that do not say otherwise. The digest cache is not
+                       used for those, as it holds digests of the files as stored.
+    :return: Iterator of (filepath, hashes, error) in input order
+    """
+    workers = workers or os.cpu_count() or 1
+    scheduler = hash_scheduler.DeviceScheduler(readers)
+    jobs = iter(jobs)
+    finished = {}  # seq -> result, until every earlier result has been yielded
+    running = {}  # future -> (st_dev, batch)
+    admitted = 0
+    next_seq = 0
+    exhausted = False
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while not exhausted and admitted - next_seq < SCHEDULE_WINDOW:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                result = _admit(scheduler, admitted, job, cache, decompress, block_size)
+                if result is not None:
+                    finished[admitted] = result
+                admitted += 1
+
+            while len(running) < workers * BATCHES_PER_WORKER:
+                picked = scheduler.next_batch(BATCH_BYTES, BATCH_FILES)
+                if picked is None:
+                    break
+                dev, batch = picked
+                todo = [job for _, (job, _) in batch]
+                future = pool.submit(_hash_batch, todo, backend, block_size, io_policy, profiles is not None)
+                running[future] = (dev, batch)
+
+            while next_seq in finished:
+                yield finished.pop(next_seq)
+                next_seq += 1
+
+            if not running:
+                if exhausted and next_seq == admitted:
+                    return
+                continue  # The window moved on; admit more jobs
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                dev, batch = running.pop(future)
+                scheduler.done(dev)
+                for (seq, ((filepath, _, unpacked), st)), (_, hashes, error, profile) in zip(batch, future.result()):
+                    if cache and error is None and not unpacked:
+                        cache.store(filepath, hashes, st)
+                    if profile is not None:
+                        profiles.append((filepath, profile))
+                    finished[seq] = filepath, hashes, error
+
+
+def hash_files(files, algorithms, **kwargs):
+    """
+    Hash many files with the same algorithms across a process pool.
+
+    :param files: Iterable of file paths
+    :param algorithms: Algorithm names to compute
+    :param kwargs: Passed on to hash_jobs
+    :return: Iterator of (filepath, hashes, error) in input order
+    """
+    return hash_jobs(((filepath, algorithms) for filepath in files), **kwargs)
+
+
+def payload_path(filepath):
+    """
+    Path of a compressed file without its compression suffix.
+
+    Digests of decompressed payloads are listed under this name, the way
+    they are published for the uncompressed file.
+
+    :param filepath: Path such as image.raw.xz
+    :return: e.g. image.raw, or the path unchanged if it has no such suffix
+    """
+    for suffix in hash_engine.COMPRESSED_SUFFIXES:
+        if filepath.endswith(suffix):
+            return filepath[:-len(suffix)]
+    return filepath
+
+
+def manifest_name(algorithm):
+    """
+    Standard manifest file name for an algorithm, e.g. SHA256SUMS.
+
+    :param algorithm: Algorithm name
+    :return: File name
+    """
+    return f"{hash_engine.SUM_TAGS[algorithm]}SUMS"
+
+
+def format_manifest_line(digest, filepath):
+    """
+    Format one GNU coreutils checksum line.
+
+    Names containing a backslash or newline are escaped the same way
+    ``sha256sum`` does it, by prefixing the line with a backslash.
+
+    :param digest: Hex digest
+    :param filepath: Path as it should appear in the manifest
+    :return: Line including the trailing newline
+    """
+    name = filepath.replace(os.sep, "/")
+    if "\\" in name or "\n" in name:
+        name = name.replace("\\", "\\\\").replace("\n", "\\n")
+        return f"\\{digest}  {name}\n"
+    return f"{digest}  {name}\n"
+
+
+class ManifestWriter:
+    """
+    Write one checksum manifest per algorithm as results arrive.
+
+    Manifests are written to temporary files and renamed into place on
+    ``close``, so an interrupted run never leaves a truncated manifest.
+    """
+
+    def __init__(self, directory, algorithms):
+        """
+        :param directory: Directory the manifests are written to
+        :param algorithms: Algorithm names, one manifest each
+        """
+        self.directory = directory
+        self.paths = {algo: os.path.join(directory, manifest_name(algo)) for algo in algorithms}
+        self.files = {
+            algo: open(path + ".tmp", "w", encoding="utf-8", newline="\n")
+            for algo, path in self.paths.items()
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
+    def write(self, filepath, hashes):
+        """
+        Add a file to every manifest it has a digest for.
+
+        :param filepath: Path of the hashed file
+        :param hashes: Dictionary mapping algorithm name to hex digest
+        """
+        name = os.path.relpath(filepath, self.directory)
+        for algo, f in self.files.items():
+            if algo in hashes:
+                f.write(format_manifest_line(hashes[algo], name))
+
+    def close(self, commit=True):
+        """
+        Close the manifests.
+
+        :param commit: Replace the final manifests (True) or discard them
+        """
+        for algo, f in self.files.items():
+            f.close()
+            if commit:
+                os.replace(f.name, self.paths[algo])
+            else:
+                os.remove(f.name)
+        self.files = {}
@@ -0,0 +1,217 @@
+"""
+Persistent digest cache for Hash Verifier.
+
+Digests are stored in a small SQLite database together with the device,
+inode, size and modification time of the file they were computed from.
+An entry is only returned while all of those still match ``os.stat``, so
+a modified or replaced file is always hashed again. The least recently
+used entries are evicted once the cache grows past its size cap.
+"""
+import os
+import sys
+import time
+import sqlite3
+
+import hash_engine
+
+# Constants
+MAX_ENTRIES = 200000  # Rows (one per file and algorithm) kept before evicting
+EVICT_INTERVAL = 1000  # Stores between eviction passes
+RACY_WINDOW_NS = 2 * 10**9  # Files modified this recently are not cached
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (path, algorithm)
+);
+CREATE INDEX IF NOT EXISTS digests_last_used ON digests (last_used);
+"""
+
+
+def default_cache_path():
+    """
+    Location of the cache database.
+
+    HASH_VERIFIER_CACHE overrides the default, which is the per-user cache
+    directory of the platform.
+
+    :return: Path of the SQLite file
+    """
+    override = os.environ.get("HASH_VERIFIER_CACHE")
+    if override:
+        return override
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "HashVerifier", "digests.sqlite3")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "hash-verifier", "digests.sqlite3")
+
+
+def stat_key(st):
+    """
+    Identity of a file version as stored in the cache.
+
+    :param st: os.stat_result
+    :return: Tuple of (device, inode, size, mtime_ns)
+    """
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class DigestCache:
+    """
+    SQLite backed cache of file digests.
+
+    A connection must only be used from the thread that created it.
+    ``hits`` and ``misses`` count lookups since the cache was opened.
+    """
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES):
+        """
+        :param path: Database file (default: default_cache_path())
+        :param max_entries: Number of rows kept before evicting
+        """
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._stores = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Close the database connection."""
+        self.db.close()
+
+    def lookup(self, filepath, algorithms, st=None):
+        """
+        Fetch cached digests that are still valid for a file.
+
+        :param filepath: Path of the file
+        :param algorithms: Algorithm names wanted
+        :param st: os.stat_result of the file (default: stat it now)
+        :return: Dictionary of the cached hex digests, possibly incomplete
+        """
+        st = st or os.stat(filepath)
+        path = os.path.abspath(filepath)
+        try:
+            rows = self.db.execute(
+                "SELECT algorithm, digest FROM digests "
+                "WHERE path = ? AND device = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                (path, *stat_key(st))
+            ).fetchall()
+        except sqlite3.Error:
+            rows = []  # A broken or locked cache behaves like an empty one
+
+        found = {algo: digest.hex() for algo, digest in rows if algo in algorithms}
+        if len(found) == len(algorithms):
+            self.hits += 1
+            try:
+                with self.db:
+                    self.db.execute(
+                        "UPDATE digests SET last_used = ? WHERE path = ?",
+                        (time.time_ns(), path)
+                    )
+            except sqlite3.Error:
+                pass
+        else:
+            self.misses += 1
+        return found
+
+    def store(self, filepath, hashes, st):
+        """
+        Remember digests computed from a file.
+
+        Nothing is stored if the file changed since ``st`` was taken or was
+        modified so recently that a later change could keep the same mtime.
+
+        :param filepath: Path of the file
+        :param hashes: Dictionary mapping algorithm name to hex digest
+        :param st: os.stat_result taken before hashing started
+        """
+        try:
+            current = os.stat(filepath)
+        except OSError:
+            return
+        now = time.time_ns()
+        if stat_key(current) != stat_key(st) or now - st.st_mtime_ns < RACY_WINDOW_NS:
+            return
+
+        path = os.path.abspath(filepath)
+        try:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(path, algo, *stat_key(st), bytes.fromhex(digest), now) for algo, digest in hashes.items()]
+                )
+
+            self._stores += 1
+            if self._stores % EVICT_INTERVAL == 1:
+                self.evict()
+        except sqlite3.Error:
+            pass
+
+    def evict(self):
+        """Delete the least recently used rows beyond ``max_entries``."""
+        (count,) = self.db.execute("SELECT COUNT(*) FROM digests").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            with self.db:
+                self.db.execute(
+                    "DELETE FROM digests WHERE rowid IN "
+                    "(SELECT rowid FROM digests ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+
+    def hash_file(self, filepath, algorithms=None, **kwargs):
+        """
+        Hash a file, reusing cached digests where possible.
+
+        Only the algorithms missing from the cache are computed.
+
+        :param filepath: Path of the file to hash
+        :param algorithms: Algorithm names to compute (default: DEFAULT_ALGORITHMS)
+        :param kwargs: Passed on to hash_engine.hash_file
+        :return: Dictionary mapping algorithm name to hex digest
+        """
+        algorithms = list(algorithms or hash_engine.DEFAULT_ALGORITHMS)
+        st = os.stat(filepath)
+        hashes = self.lookup(filepath, algorithms, st)
+
+        missing = [algo for algo in algorithms if algo not in hashes]
+        if missing:
+            computed = hash_engine.hash_file(filepath, missing, **kwargs)
+            self.store(filepath, computed, st)
+            hashes.update(computed)
+
+        return {algo: hashes[algo] for algo in algorithms}
+
+
+def open_cache(path=None):
+    """
+    Open the digest cache, or return None if it is unavailable.
+
+    A missing or read-only cache directory must never prevent hashing.
+
+    :param path: Database file (default: default_cache_path())
+    :return: DigestCache or None
+    """
+    try:
+        return DigestCache(path)
+    except (OSError, sqlite3.Error):
+        return None
@@ -0,0 +1,882 @@
+"""
+Command-line interface for Hash Verifier.
+
+Runs the same hashing engine as the GUI without importing tkinter, so it
+starts quickly and works on headless machines.
+
+Exit codes:
+    0  All files hashed and every expected hash matched
+    1  At least one expected hash did not match
+    2  Invalid command-line usage
+    3  At least one file could not be read
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import collections
+
+import hash_cache
+import hash_copy
+import hash_engine
+import hash_follow
+import hash_profile
+import hash_scheduler
+import hash_tuner
+from hash_progress import Progress, ProgressPrinter, format_size
+
+# Exit codes
+EXIT_OK = 0
+EXIT_MISMATCH = 1
+EXIT_USAGE = 2
+EXIT_IO_ERROR = 3
+
+def parse_algorithms(value):
+    """
+    Parse a comma separated algorithm list for argparse.
+
+    :param value: e.g. "sha256,md5"
+    :return: List of canonical algorithm names
+    """
+    try:
+        return [hash_engine.resolve_algorithm(name) for name in value.split(",") if name.strip()]
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_block_size(value):
+    """
+    Parse a block size such as "1M" or "auto" for argparse.
+
+    :param value: Size with optional K/M suffix, or "auto"
+    :return: Size in bytes, or None for automatic tuning
+    """
+    if value.lower() == "auto":
+        return None
+    try:
+        return hash_tuner.parse_block_size(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid block size: {value}")
+
+
+def build_parser():
+    """
+    Build the argument parser.
+
+    :return: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        prog="hashverify",
+        description="Calculate and verify file hashes without a GUI."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # Options shared by several commands, defined once so their help stays in sync
+    read_options = argparse.ArgumentParser(add_help=False)
+    read_options.add_argument("--backend", choices=hash_engine.READ_BACKENDS, default=None,
+        help="force a read backend (default: auto)")
+    read_options.add_argument("--block-size", type=parse_block_size, default=None, metavar="SIZE",
+        help="read block size such as 256K or 4M (default: auto, tuned per device)")
+    policy_options = argparse.ArgumentParser(add_help=False)
+    policy_options.add_argument("--io-policy", choices=hash_engine.IO_POLICIES, default=None,
+        help="page cache policy: normal, sequential read-ahead, nocache drops read data, "
+             "direct bypasses the cache (default: normal)")
+    reader_options = argparse.ArgumentParser(add_help=False)
+    reader_options.add_argument("--ssd-readers", type=int, default=None, metavar="N",
+        help="files read at once from one SSD (default: %d)" % hash_scheduler.DEFAULT_READERS["ssd"])
+    reader_options.add_argument("--hdd-readers", type=int, default=None, metavar="N",
+        help="files read at once from one spinning disk (default: %d)" % hash_scheduler.DEFAULT_READERS["hdd"])
+    profile_options = argparse.ArgumentParser(add_help=False)
+    profile_options.add_argument("--profile", metavar="FILE",
+        help="write read, queue and per-algorithm timings of every file to FILE as JSON")
+    cache_options = argparse.ArgumentParser(add_help=False)
+    cache_options.add_argument("--no-cache", action="store_true",
+        help="ignore and do not update the digest cache")
+
+    hash_cmd = commands.add_parser("hash", help="hash files and optionally verify them",
+        parents=[read_options, policy_options, profile_options, cache_options])
+    hash_cmd.add_argument("files", nargs="+", metavar="FILE", help="files to hash")
+    hash_cmd.add_argument("-a", "--algorithms", type=parse_algorithms, metavar="LIST",
+        help="comma separated algorithms (default: " + ",".join(hash_engine.DEFAULT_ALGORITHMS).lower() + ")")
+    hash_cmd.add_argument("-e", "--expect", action="append", default=[], metavar="HASH",
+        help="expected hash, once per FILE in the same order; "
+             "only the matching algorithms are computed unless -a is given")
+    hash_cmd.add_argument("-f", "--format", choices=("sums", "json"), default="sums",
+        help="sha256sum-style lines or one JSON object per file (default: sums)")
+    hash_cmd.add_argument("--decompress", action="store_true",
+        help="hash the decompressed payload of .gz, .xz and .bz2 files (implies --no-cache)")
+    hash_cmd.add_argument("--follow", action="store_true",
+        help="keep hashing while FILE grows, e.g. a download in progress (implies --no-cache)")
+    hash_cmd.add_argument("--stable-timeout", type=float, default=hash_follow.STABLE_TIMEOUT, metavar="SECONDS",
+        help=f"with --follow, seconds without growth before FILE counts as complete "
+             f"(default: {hash_follow.STABLE_TIMEOUT:g})")
+    hash_cmd.add_argument("--done-marker", metavar="PATH",
+        help="with --follow, FILE is complete as soon as PATH exists")
+    hash_cmd.set_defaults(func=cmd_hash)
+
+    batch_cmd = commands.add_parser("batch", help="hash directory trees into checksum manifests",
+        parents=[read_options, policy_options, reader_options, profile_options, cache_options])
+    batch_cmd.add_argument("paths", nargs="+", metavar="PATH", help="directories or files to hash")
+    batch_cmd.add_argument("-a", "--algorithms", type=parse_algorithms, default=["SHA-256"], metavar="LIST",
+        help="comma separated algorithms, one manifest each (default: sha256)")
+    batch_cmd.add_argument("-o", "--output", metavar="DIR",
+        help="directory for the manifests, or - for stdout (default: first PATH)")
+    batch_cmd.add_argument("-j", "--jobs", type=int, default=None, metavar="N",
+        help="number of worker processes (default: CPU count)")
+    batch_cmd.add_argument("--decompress", action="store_true",
+        help="hash the decompressed payload of .gz, .xz and .bz2 files and list it without the suffix (implies --no-cache)")
+    batch_cmd.set_defaults(func=cmd_batch)
+
+    check_cmd = commands.add_parser("check", help="verify the files listed in checksum manifests",
+        parents=[read_options, policy_options, reader_options, profile_options])
+    check_cmd.add_argument("manifests", nargs="+", metavar="MANIFEST",
+        help="GNU (sha256sum) or BSD (tagged) checksum files")
+    check_cmd.add_argument("-q", "--quiet", action="store_true",
+        help="only report files that are not OK")
+    check_cmd.add_argument("-f", "--format", choices=("text", "json"), default="text",
+        help="sha256sum -c style lines or one JSON object per file (default: text)")
+    check_cmd.add_argument("-j", "--jobs", type=int, default=None, metavar="N",
+        help="number of worker processes (default: CPU count)")
+    check_cmd.add_argument("--decompress", action="store_true",
+        help="verify listed files that only exist as .gz, .xz or .bz2 through their decompressed payload")
+    check_cmd.add_argument("--use-cache", action="store_true",
+        help="answer unchanged files from the digest cache instead of reading them (default: always read)")
+    check_cmd.set_defaults(func=cmd_check)
+
+    tree_cmd = commands.add_parser("tree", help="parallel chunked Merkle tree digest of one large file")
+    tree_cmd.add_argument("file", metavar="FILE", help="file to hash")
+    tree_cmd.add_argument("-a", "--algorithm", type=hash_engine.resolve_algorithm, default="SHA-256",
+        metavar="ALGO", help="digest used for leaves and nodes (default: sha256)")
+    tree_cmd.add_argument("--chunk-size", type=parse_block_size, default=None, metavar="SIZE",
+        help="bytes per leaf (default: 64M)")
+    tree_cmd.add_argument("-o", "--output", metavar="TREEFILE",
+        help="where to save the chunk digests (default: FILE.tree.json)")
+    tree_cmd.add_argument("--verify", metavar="TREEFILE",
+        help="compare FILE against a saved tree and list the regions that differ")
+    tree_cmd.add_argument("--chunks", type=lambda v: [int(i) for i in v.split(",")], metavar="LIST",
+        help="with --verify, only re-read these chunk numbers")
+    tree_cmd.add_argument("-j", "--jobs", type=int, default=None, metavar="N",
+        help="number of worker processes (default: CPU count)")
+    tree_cmd.set_defaults(func=cmd_tree)
+
+    archive_cmd = commands.add_parser("archive", help="hash the members of a zip or tar archive without extracting")
+    archive_cmd.add_argument("archive", metavar="ARCHIVE", help="zip, tar, tar.gz, tar.bz2 or tar.xz file")
+    archive_cmd.add_argument("members", nargs="*", metavar="MEMBER", help="members to hash (default: every file)")
+    archive_cmd.add_argument("-a", "--algorithms", type=parse_algorithms, metavar="LIST",
+        help="comma separated algorithms (default: " + ",".join(hash_engine.DEFAULT_ALGORITHMS).lower() + ")")
+    archive_cmd.add_argument("-c", "--check", metavar="MANIFEST",
+        help="verify the members against a checksum manifest instead of printing their hashes")
+    archive_cmd.add_argument("-f", "--format", choices=("sums", "json"), default="sums",
+        help="output format (default: sums)")
+    archive_cmd.add_argument("-j", "--jobs", type=int, default=None, metavar="N",
+        help="number of zip members hashed at once (default: CPU count)")
+    archive_cmd.set_defaults(func=cmd_archive)
+
+    copy_cmd = commands.add_parser("copy", help="copy a file while hashing it, reading the source once")
+    copy_cmd.add_argument("source", metavar="SOURCE", help="file to copy")
+    copy_cmd.add_argument("destination", metavar="DEST", help="path of the copy, or an existing directory")
+    copy_cmd.add_argument("-a", "--algorithms", type=parse_algorithms, metavar="LIST",
+        help="comma separated algorithms (default: " + ",".join(hash_engine.DEFAULT_ALGORITHMS).lower()
+             + ", or those matching --expect)")
+    copy_cmd.add_argument("-e", "--expect", metavar="HASH",
+        help="expected hash of the source; the copy is discarded if it does not match")
+    copy_cmd.add_argument("--verify", action="store_true",
+        help="read the copy back from disk and compare it with the source")
+    copy_cmd.add_argument("-f", "--format", choices=("sums", "json"), default="sums",
+        help="output format (default: sums)")
+    copy_cmd.add_argument("--block-size", type=parse_block_size, default=None, metavar="SIZE",
+        help="read and write size, e.g. 4M (default: 1M)")
+    copy_cmd.set_defaults(func=cmd_copy)
+
+    watch_cmd = commands.add_parser("watch", help="keep a directory's checksum manifests up to date",
+        parents=[cache_options])
+    watch_cmd.add_argument("directory", metavar="DIR", help="directory to watch")
+    watch_cmd.add_argument("-a", "--algorithms", type=parse_algorithms, default=["SHA-256"], metavar="LIST",
+        help="comma separated algorithms, one manifest each (default: sha256)")
+    watch_cmd.add_argument("-f", "--format", choices=("text", "json"), default="text",
+        help="one line or one JSON object per drifted file (default: text)")
+    watch_cmd.add_argument("--once", action="store_true",
+        help="sync the manifests once and exit instead of watching")
+    watch_cmd.add_argument("--poll", action="store_true",
+        help="re-scan periodically instead of using inotify")
+    watch_cmd.add_argument("--interval", type=float, default=None, metavar="SECONDS",
+        help="seconds between scans when polling (default: 5)")
+    watch_cmd.add_argument("-j", "--jobs", type=int, default=None, metavar="N",
+        help="number of worker processes (default: CPU count)")
+    watch_cmd.set_defaults(func=cmd_watch)
+
+    dedupe_cmd = commands.add_parser("dedupe", help="find duplicate files",
+        parents=[cache_options])
+    dedupe_cmd.add_argument("paths", nargs="+", metavar="PATH", help="directories or files to search")
+    dedupe_cmd.add_argument("-a", "--algorithm", type=hash_engine.resolve_algorithm, default="SHA-256",
+        metavar="ALGO", help="digest used to compare contents (default: sha256)")
+    dedupe_cmd.add_argument("--min-size", type=parse_block_size, default=1, metavar="SIZE",
+        help="ignore files smaller than SIZE, e.g. 4K (default: 1, skips empty files)")
+    dedupe_cmd.add_argument("-f", "--format", choices=("text", "json"), default="text",
+        help="blocks of paths or one JSON object per group (default: text)")
+    dedupe_cmd.add_argument("-j", "--jobs", type=int, default=None, metavar="N",
+        help="number of worker processes (default: CPU count)")
+    dedupe_cmd.set_defaults(func=cmd_dedupe)
+
+    serve_cmd = commands.add_parser("serve", help="run a local JSON hashing service for other tools",
+        parents=[read_options, cache_options])
+    endpoint = serve_cmd.add_mutually_exclusive_group()
+    endpoint.add_argument("--port", type=int, default=None,
+        help="listen on a TCP port on 127.0.0.1 instead, 0 picks a free one; requests must carry the token "
+             "written to the token file (default where Unix sockets are unavailable: 8765)")
+    endpoint.add_argument("--socket", metavar="PATH",
+        help="Unix domain socket to listen on (default: hash-service.sock in a private runtime directory)")
+    serve_cmd.add_argument("-j", "--jobs", type=int, default=None, metavar="N",
+        help="files hashed at once (default: CPU count)")
+    serve_cmd.add_argument("--processes", action="store_true",
+        help="hash in worker processes instead of threads (no progress events)")
+    serve_cmd.add_argument("--queue", type=int, default=None, metavar="N",
+        help="queued jobs before new ones are refused (default: 256)")
+    serve_cmd.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def format_sums(filepath, hashes):
+    """
+    Format hashes as checksum lines.
+
+    A single algorithm uses the GNU layout understood by ``sha256sum -c``,
+    several algorithms use the tagged BSD layout.
+
+    :param filepath: Path of the hashed file
+    :param hashes: Dictionary mapping algorithm name to hex digest
+    :return: Output text without a trailing newline
+    """
+    if len(hashes) == 1:
+        (digest,) = hashes.values()
+        return f"{digest}  {filepath}"
+    return "\n".join(f"{hash_engine.SUM_TAGS[algo]} ({filepath}) = {digest}" for algo, digest in hashes.items())
+
+
+def hash_one(filepath, expected, args, cache=None, progress=None):
+    """
+    Hash a single file and build its result record.
+
+    Without an explicit algorithm list, a known expected hash limits the work
+    to the default algorithms that could have produced it. The opt-in ones of
+    the same length are computed in a second pass only if none of those match.
+
+    :param filepath: Path of the file to hash
+    :param expected: Expected hash or None
+    :param args: Parsed command-line arguments
+    :param cache: Optional hash_cache.DigestCache
+    :param progress: Optional callable receiving (bytes_read, filesize)
+    :return: Dictionary describing the result
+    """
+    result = {"path": filepath}
+    algorithms = args.algorithms
+    if not algorithms and expected is not None:
+        algorithms = list(hash_engine.preferred_algorithms(expected))
+
+    if os.path.isdir(filepath):
+        result["error"] = "Is a directory"
+        return result
+
+    try:
+        result["size"] = os.path.getsize(filepath)
+        backend, buffer_size = hash_tuner.read_plan(filepath, args.backend, args.block_size)
+        stats = {}
+        timings = hash_profile.HashProfile() if args.profile else None
+        options = {"progress": progress, "backend": backend, "buffer_size": buffer_size, "stats": stats,
+                   "io_policy": args.io_policy, "profile": timings, "decompress": args.decompress}
+        if args.follow:
+            # A partial file must never be looked up in or stored to the cache
+            watcher = hash_follow.watcher_for(filepath, args.stable_timeout, args.done_marker)
+            result["hashes"] = hash_engine.hash_file(filepath, algorithms, follow=watcher, **options)
+            result["size"] = watcher.size or result["size"]
+        elif cache:
+            hits = cache.hits
+            result["hashes"] = cache.hash_file(filepath, algorithms, **options)
+            result["cached"] = cache.hits > hits
+        else:
+            result["hashes"] = hash_engine.hash_file(filepath, algorithms, **options)
+
+        if expected is not None and not args.algorithms and not hash_engine.match_hash(expected, result["hashes"]):
+            remaining = hash_engine.remaining_algorithms(expected, result["hashes"])
+            if remaining:
+                # The file is complete by now; the profile only covers the first pass
+                second = cache.hash_file if cache and not args.follow else hash_engine.hash_file
+                result["hashes"].update(second(filepath, remaining, **dict(options, profile=None)))
+    except OSError as e:
+        result["error"] = e.strerror or str(e)
+        return result
+
+    if stats.get("sparse_bytes"):
+        result["sparse_bytes"] = stats["sparse_bytes"]  # Holes that were not read from disk
+    if "decompressed_bytes" in stats:
+        result["decompressed_bytes"] = stats["decompressed_bytes"]
+    if timings is not None and timings.wall_ns:
+        result["profile"] = timings.as_dict()  # Not set when the cache answered
+    if expected is not None:
+        result["expected"] = expected
+        result["match"] = hash_engine.match_hash(expected, result["hashes"])
+
+    return result
+
+
+def cmd_hash(args, parser):
+    """
+    Run the ``hash`` command.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    expected = [hash_engine.normalize_hash(value) for value in args.expect]
+    if expected and len(expected) != len(args.files):
+        parser.error("--expect must be given once per FILE")
+    for value in expected:
+        if not re.fullmatch(r'[a-f0-9]+', value) or not hash_engine.algorithms_for_hash(value):
+            parser.error(f"not a recognised hash: {value}")
+    if (args.done_marker or args.stable_timeout != hash_follow.STABLE_TIMEOUT) and not args.follow:
+        parser.error("--stable-timeout and --done-marker require --follow")
+    if args.follow and args.decompress:
+        parser.error("--follow cannot be combined with --decompress")
+
+    # The cache holds digests of files as stored, not of their payload
+    cache = None if args.no_cache or args.follow or args.decompress else hash_cache.open_cache()
+    progress = Progress()
+    profiles = []
+    exit_code = EXIT_OK
+    with ProgressPrinter(progress) as printer:
+        for index, filepath in enumerate(args.files):
+            progress.update(0, 0)
+            result = hash_one(filepath, expected[index] if expected else None, args, cache, progress.update)
+
+            if "error" in result:
+                printer.print(f"hashverify: {filepath}: {result['error']}", file=sys.stderr)
+                exit_code = EXIT_IO_ERROR
+            elif "expected" in result and not result["match"]:
+                exit_code = max(exit_code, EXIT_MISMATCH)
+            if "profile" in result:
+                profiles.append((filepath, result["profile"]))
+
+            if args.format == "json":
+                printer.print(json.dumps(result))
+            elif "hashes" in result:
+                printer.print(format_sums(filepath, result["hashes"]))
+                if "sparse_bytes" in result:
+                    printer.print(f"{filepath}: {format_size(result['sparse_bytes'])} of holes skipped",
+                        file=sys.stderr)
+                if "expected" in result:
+                    status = f"OK ({result['match']})" if result["match"] else "FAILED"
+                    printer.print(f"{filepath}: {status}", file=sys.stderr)
+
+    if cache:
+        cache.close()
+    if args.profile:
+        exit_code = max(exit_code, _write_profile(args.profile, profiles))
+    return exit_code
+
+
+def _write_profile(path, profiles):
+    """Write the --profile report, returning an exit code."""
+    try:
+        hash_profile.write_report(path, profiles)
+    except OSError as e:
+        print(f"hashverify: {path}: {e.strerror or e}", file=sys.stderr)
+        return EXIT_IO_ERROR
+    return EXIT_OK
+
+
+def _readers(args, parser):
+    """Reader limit overrides for hash_scheduler from --ssd-readers and --hdd-readers."""
+    readers = {}
+    for kind, value in ((hash_scheduler.SSD, args.ssd_readers), (hash_scheduler.HDD, args.hdd_readers)):
+        if value is not None:
+            if value < 1:
+                parser.error(f"--{kind}-readers must be at least 1")
+            readers[kind] = value
+    return readers
+
+
+def _size(filepath):
+    try:
+        return os.path.getsize(filepath)
+    except OSError:
+        return 0
+
+
+def cmd_batch(args, parser):
+    """
+    Run the ``batch`` command.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    import hash_batch
+
+    to_stdout = args.output == "-"
+    if to_stdout and len(args.algorithms) != 1:
+        parser.error("writing to stdout requires exactly one algorithm")
+    for path in args.paths:
+        if not os.path.exists(path):
+            parser.error(f"no such file or directory: {path}")
+
+    directory = args.output
+    if directory is None:
+        directory = args.paths[0] if os.path.isdir(args.paths[0]) else os.curdir
+
+    # Never hash the manifests that are being written
+    skip = set()
+    if not to_stdout:
+        for algo in args.algorithms:
+            manifest = os.path.abspath(os.path.join(directory, hash_batch.manifest_name(algo)))
+            skip.update((manifest, manifest + ".tmp"))
+    files = (f for f in hash_batch.iter_files(args.paths) if os.path.abspath(f) not in skip)
+
+    cache = None if args.no_cache or args.decompress else hash_cache.open_cache()
+    profiles = [] if args.profile else None
+    results = hash_batch.hash_files(files, args.algorithms, workers=args.jobs, backend=args.backend,
+        block_size=args.block_size, cache=cache, io_policy=args.io_policy, readers=_readers(args, parser),
+        profiles=profiles, decompress=args.decompress)
+    listed = hash_batch.payload_path if args.decompress else str
+    hashed = failed = 0
+    progress = Progress()
+
+    with ProgressPrinter(progress) as printer:
+        if to_stdout:
+            (algo,) = args.algorithms
+            for filepath, hashes, error in results:
+                if error:
+                    printer.print(f"hashverify: {filepath}: {error}", file=sys.stderr)
+                    failed += 1
+                    continue
+                printer.print(hash_batch.format_manifest_line(hashes[algo], listed(filepath))[:-1])
+                progress.advance(_size(filepath))
+                hashed += 1
+        else:
+            with hash_batch.ManifestWriter(directory, args.algorithms) as writer:
+                for filepath, hashes, error in results:
+                    if error:
+                        printer.print(f"hashverify: {filepath}: {error}", file=sys.stderr)
+                        failed += 1
+                        continue
+                    writer.write(listed(filepath), hashes)
+                    progress.advance(_size(filepath))
+                    hashed += 1
+
+    print(f"{hashed} files hashed, {failed} failed", file=sys.stderr)
+    if cache:
+        print(f"cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+        cache.close()
+    if args.profile and _write_profile(args.profile, profiles):
+        return EXIT_IO_ERROR
+    return EXIT_IO_ERROR if failed else EXIT_OK
+
+
+def cmd_check(args, parser):
+    """
+    Run the ``check`` command.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    import hash_manifest
+
+    for manifest in args.manifests:
+        if not os.path.isfile(manifest):
+            parser.error(f"no such manifest: {manifest}")
+
+    readers = _readers(args, parser)
+    profiles = [] if args.profile else None
+    # Verifying means reading the data; a file corrupted in place keeps its size and mtime
+    cache = hash_cache.open_cache() if args.use_cache else None
+    counts = dict.fromkeys((hash_manifest.OK, hash_manifest.FAILED, hash_manifest.MISSING,
+        hash_manifest.UNREADABLE), 0)
+    bad_lines = 0
+    progress = Progress()
+
+    with ProgressPrinter(progress) as printer:
+        for manifest in args.manifests:
+            errors = []
+            results = hash_manifest.verify_manifest(manifest, errors=errors, workers=args.jobs,
+                backend=args.backend, block_size=args.block_size, cache=cache, io_policy=args.io_policy,
+                readers=readers, profiles=profiles, decompress=args.decompress)
+            for result in results:
+                counts[result.status] += 1
+                progress.advance(_size(result.path))
+
+                if args.format == "json":
+                    printer.print(json.dumps({"manifest": manifest, **result._asdict()}))
+                elif result.status != hash_manifest.OK or not args.quiet:
+                    detail = f" ({result.error})" if result.error else ""
+                    printer.print(f"{result.name}: {result.status}{detail}")
+
+            for number in errors:
+                printer.print(f"hashverify: {manifest}: {number}: improperly formatted checksum line",
+                    file=sys.stderr)
+            bad_lines += len(errors)
+
+    summary = ", ".join(f"{count} {status}" for status, count in counts.items() if count)
+    print(summary or "no files listed", file=sys.stderr)
+    if cache:
+        cache.close()
+    if args.profile and _write_profile(args.profile, profiles):
+        return EXIT_IO_ERROR
+
+    if counts[hash_manifest.MISSING] or counts[hash_manifest.UNREADABLE]:
+        return EXIT_IO_ERROR
+    if counts[hash_manifest.FAILED]:
+        return EXIT_MISMATCH
+    return EXIT_OK
+
+
+def cmd_tree(args, parser):
+    """
+    Run the ``tree`` command.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    import hash_tree
+
+    if not os.path.isfile(args.file):
+        parser.error(f"not a file: {args.file}")
+    if args.chunks and not args.verify:
+        parser.error("--chunks requires --verify")
+
+    progress = Progress()
+    try:
+        if args.verify:
+            tree = hash_tree.load_tree(args.verify)
+            invalid = [i for i in args.chunks or () if i not in range(len(tree["leaves"]))]
+            if invalid:
+                parser.error(f"--chunks: {args.verify} has chunks 0-{len(tree['leaves']) - 1}, "
+                             f"not {', '.join(map(str, invalid))}")
+            with ProgressPrinter(progress):
+                root_matches, bad = hash_tree.verify_tree(args.file, tree, args.chunks, args.jobs, progress.update)
+            for index, offset, length in bad:
+                print(f"chunk {index}: bytes {offset}-{offset + length - 1} differ")
+            if bad or root_matches is False:
+                print(f"{args.file}: FAILED ({len(bad)} of {len(tree['leaves'])} chunks differ)")
+                return EXIT_MISMATCH
+            print(f"{args.file}: OK" + (" (checked chunks only)" if root_matches is None else ""))
+            return EXIT_OK
+
+        with ProgressPrinter(progress):
+            tree = hash_tree.build_tree(args.file, args.algorithm, args.chunk_size or hash_tree.CHUNK_SIZE, args.jobs,
+                                        progress.update)
+        output = args.output or args.file + hash_tree.TREE_SUFFIX
+        hash_tree.save_tree(tree, output)
+    except (OSError, ValueError) as e:
+        print(f"hashverify: {e}", file=sys.stderr)
+        return EXIT_IO_ERROR
+
+    print(f"{tree['root']}  {args.file}")
+    print(f"{len(tree['leaves'])} chunk digests saved to {output}", file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_archive(args, parser):
+    """
+    Run the ``archive`` command.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    import tarfile
+    import zipfile
+
+    import hash_archive
+    import hash_manifest
+
+    if not os.path.isfile(args.archive):
+        parser.error(f"no such archive: {args.archive}")
+
+    members = [hash_archive.member_name(name) for name in args.members] or None
+    algorithms = args.algorithms
+    expected = None
+    if args.check:
+        if not os.path.isfile(args.check):
+            parser.error(f"no such manifest: {args.check}")
+        errors = []
+        expected = {
+            hash_archive.member_name(name): digests
+            for name, digests in hash_manifest.iter_groups(hash_manifest.iter_entries(args.check, errors))
+        }
+        for number in errors:
+            print(f"hashverify: {args.check}: {number}: improperly formatted checksum line", file=sys.stderr)
+        if members is not None:
+            expected = {name: digests for name, digests in expected.items() if name in members}
+        members = list(expected)
+        algorithms = list(dict.fromkeys(algo for digests in expected.values() for algo in digests))
+
+    counts = collections.Counter()
+    seen = set()
+    try:
+        for result in hash_archive.hash_archive(args.archive, algorithms, members, args.jobs):
+            seen.add(result.name)
+            if expected is None:
+                if result.error:
+                    print(f"hashverify: {args.archive}: {result.name}: {result.error}", file=sys.stderr)
+                    counts[hash_manifest.UNREADABLE] += 1
+                elif args.format == "json":
+                    print(json.dumps(result._asdict()))
+                else:
+                    print(format_sums(result.name, result.hashes))
+                continue
+
+            digests = expected[result.name]
+            if result.error:
+                status = hash_manifest.UNREADABLE
+            elif all(result.hashes[algo] == digest for algo, digest in digests.items()):
+                status = hash_manifest.OK
+            else:
+                status = hash_manifest.FAILED
+            counts[status] += 1
+            _report_member(args, result.name, status, result.error)
+    except (ValueError, OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+        print(f"hashverify: {args.archive}: {e}", file=sys.stderr)
+        return EXIT_IO_ERROR
+
+    for name in (members or ()):
+        if name not in seen:
+            counts[hash_manifest.MISSING] += 1
+            if expected is not None:
+                _report_member(args, name, hash_manifest.MISSING, "not in archive")
+            else:
+                print(f"hashverify: {args.archive}: {name}: not in archive", file=sys.stderr)
+
+    if expected is not None:
+        summary = ", ".join(f"{count} {status}" for status, count in counts.items() if count)
+        print(summary or "no members listed", file=sys.stderr)
+    if counts[hash_manifest.MISSING] or counts[hash_manifest.UNREADABLE]:
+        return EXIT_IO_ERROR
+    if counts[hash_manifest.FAILED]:
+        return EXIT_MISMATCH
+    return EXIT_OK
+
+
+def _report_member(args, name, status, error):
+    if args.format == "json":
+        print(json.dumps({"archive": args.archive, "name": name, "status": status, "error": error}))
+    else:
+        detail = f" ({error})" if error else ""
+        print(f"{name}: {status}{detail}")
+
+
+def cmd_copy(args, parser):
+    """
+    Run the ``copy`` command.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    if not os.path.isfile(args.source):
+        parser.error(f"not a file: {args.source}")
+    destination = args.destination
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(args.source))
+    if os.path.exists(destination) and os.path.samefile(args.source, destination):
+        parser.error(f"{args.source} and {destination} are the same file")
+
+    expected = hash_engine.normalize_hash(args.expect) if args.expect else None
+    if expected is not None and (not re.fullmatch(r'[a-f0-9]+', expected)
+                                 or not hash_engine.algorithms_for_hash(expected)):
+        parser.error(f"not a recognised hash: {args.expect}")
+
+    progress = Progress()
+    try:
+        with ProgressPrinter(progress):
+            result = hash_copy.copy_file(args.source, destination, args.algorithms, expected, args.verify,
+                                         progress.update, args.block_size or hash_copy.COPY_BUFFER_SIZE)
+    except OSError as e:
+        print(f"hashverify: {e.filename or destination}: {e.strerror or e}", file=sys.stderr)
+        return EXIT_IO_ERROR
+
+    kept = result.verified is not False and (expected is None or result.match is not None)
+    shown = destination if kept else args.source
+    if args.format == "json":
+        print(json.dumps({"source": args.source, "path": shown, **result._asdict(),
+                          **({"expected": expected} if expected is not None else {})}))
+    else:
+        print(format_sums(shown, result.hashes))
+
+    if expected is not None and result.match is None:
+        print(f"hashverify: {args.source}: FAILED, copy discarded", file=sys.stderr)
+        return EXIT_MISMATCH
+    if result.verified is False:
+        print(f"hashverify: {destination}: read-back does not match the source, copy discarded", file=sys.stderr)
+        return EXIT_IO_ERROR
+    if expected is not None:
+        print(f"{destination}: OK ({result.match})", file=sys.stderr)
+    if result.verified:
+        print(f"{destination}: read-back OK", file=sys.stderr)
+    return EXIT_OK
+
+
+def cmd_watch(args, parser):
+    """
+    Run the ``watch`` command.
+
+    Runs until interrupted unless ``--once`` is given.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    import hash_watch
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"not a directory: {args.directory}")
+
+    cache = None if args.no_cache else hash_cache.open_cache()
+    watcher = hash_watch.ManifestWatcher(args.directory, args.algorithms, cache, args.jobs)
+    source = None
+    exit_code = EXIT_OK
+    try:
+        if args.once:
+            batches = [watcher.sync()]
+        else:
+            interval = hash_watch.POLL_INTERVAL if args.interval is None else args.interval
+            source = hash_watch.open_source(args.directory, args.poll, interval)
+            kind = "inotify" if isinstance(source, hash_watch.InotifySource) else f"polling every {interval:g}s"
+            print(f"watching {args.directory} ({kind}), press Ctrl+C to stop", file=sys.stderr)
+            batches = watcher.watch(source)
+
+        for drift in batches:
+            for item in drift:
+                if item.kind == hash_watch.UNREADABLE:
+                    exit_code = EXIT_IO_ERROR
+                if args.format == "json":
+                    print(json.dumps(item._asdict()), flush=True)
+                else:
+                    detail = f" ({item.error})" if item.error else ""
+                    print(f"{item.name}: {item.kind}{detail}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"hashverify: {e}", file=sys.stderr)
+        exit_code = EXIT_IO_ERROR
+    finally:
+        if source:
+            source.close()
+        if cache:
+            cache.close()
+    return exit_code
+
+
+def cmd_dedupe(args, parser):
+    """
+    Run the ``dedupe`` command.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    import hash_dedupe
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            parser.error(f"no such file or directory: {path}")
+
+    cache = None if args.no_cache else hash_cache.open_cache()
+    errors = []
+    stats = {}
+    groups = hash_dedupe.find_duplicates(args.paths, args.algorithm, args.min_size, workers=args.jobs,
+        cache=cache, errors=errors, stats=stats)
+    if cache:
+        cache.close()
+
+    for group in groups:
+        if args.format == "json":
+            print(json.dumps(group._asdict()))
+            continue
+        print(f"{len(group.paths)} files of {format_size(group.size)}, "
+              f"{format_size(group.reclaimable)} reclaimable ({args.algorithm} {group.digest})")
+        for path in group.paths:
+            print(f"  {path}")
+        print()
+
+    for path, error in errors:
+        print(f"hashverify: {path}: {error}", file=sys.stderr)
+    reclaimable = sum(group.reclaimable for group in groups)
+    print(f"{len(groups)} duplicate groups, {format_size(reclaimable)} reclaimable "
+          f"({stats['size_candidates']} same-size files, {stats['sample_candidates']} after sampling, "
+          f"{stats['fully_hashed']} fully hashed)", file=sys.stderr)
+    return EXIT_IO_ERROR if errors else EXIT_OK
+
+
+def cmd_serve(args, parser):
+    """
+    Run the ``serve`` command until interrupted.
+
+    :param args: Parsed command-line arguments
+    :param parser: Parser used to report usage errors
+    :return: Exit code
+    """
+    import asyncio
+
+    import hash_service
+
+    if args.socket and not hasattr(asyncio, "start_unix_server"):
+        parser.error("--socket is not supported on this platform")
+    if args.queue is not None and args.queue < 1:
+        parser.error("--queue must be at least 1")
+
+    socket_path = args.socket
+    if socket_path is None and args.port is None:
+        socket_path = hash_service.default_socket_path()
+    port = hash_service.DEFAULT_PORT if args.port is None else args.port
+    queue = hash_service.QUEUE_LIMIT if args.queue is None else args.queue
+    token = None
+    note = ""
+    if socket_path is None:
+        # Other local users can reach a TCP port
+        try:
+            token = hash_service.write_token()
+        except OSError as e:
+            print(f"hashverify: {e}", file=sys.stderr)
+            return EXIT_IO_ERROR
+        note = f", token in {hash_service.default_token_path()}"
+
+    async def run():
+        service = hash_service.HashService(args.jobs, args.processes, queue, args.backend,
+            args.block_size, not args.no_cache)
+        await hash_service.serve(service, port, socket_path, token=token,
+            ready=lambda endpoint: print(f"listening on {endpoint}{note}, press Ctrl+C to stop", file=sys.stderr))
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"hashverify: {e}", file=sys.stderr)
+        return EXIT_IO_ERROR
+    return EXIT_OK
+
+
+def main(argv=None):
+    """
+    Entry point of the command-line interface.
+
+    :param argv: Argument list (default: sys.argv[1:])
+    :return: Exit code
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        hash_engine.check_settings()
+    except ValueError as e:
+        parser.error(str(e))
+    return args.func(args, parser)
+
+
+if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()  # Required for worker processes in frozen builds
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Single-pass copy-and-verify for Hash Verifier.
+
+Copying an image to staging storage and then hashing both copies reads
+the data three times. copy_file reads the source once into a ring of
+buffers and hands every buffer both to a writer thread and to the digest
+workers of hash_engine.ParallelHasher, so reading, writing and hashing
+overlap. A buffer is only reused once the writer and every digest are done
+with it.
+
+The copy is written next to the destination as ``<destination>.tmp`` and
+renamed into place only when it is known to be good: if an expected hash
+does not match, or the optional read-back of the written data differs from
+the source, the temporary file is removed and the destination is left
+untouched.
+"""
+import os
+import shutil
+import threading
+import collections
+
+import hash_engine
+
+# Constants
+COPY_BUFFER_SIZE = 1024 * 1024  # 1MB, large writes keep the destination busy
+
+CopyResult = collections.namedtuple("CopyResult", "size hashes match verified")
+
+
+class _Writer(hash_engine.QueueConsumer):
+    """Thread that writes queued chunks to the destination in order."""
+
+    def __init__(self, f, queue_depth):
+        super().__init__("copy-writer", queue_depth, threading.Condition())
+        self.f = f
+        self.submitted = 0
+
+    def consume(self, data):
+        self.f.write(data)
+
+    def put(self, data):
+        """
+        Queue a chunk for writing.
+
+        :param data: Bytes-like object that must not change until ``wait``
+                     has returned for the sequence number it was given
+        :return: Sequence number of the chunk
+        :raise OSError: If an earlier write failed
+        """
+        if self.error is not None:
+            raise self.error  # No point reading on once the destination is lost
+        self.chunks.put(data)
+        self.submitted += 1
+        return self.submitted
+
+    def wait(self, sequence):
+        """Block until the chunk with the given sequence number was written."""
+        with self.consumed:
+            self.consumed.wait_for(lambda: self.done >= sequence)
+
+    def close(self):
+        """Stop the thread once everything queued is written."""
+        self.stop()
+        self.join()
+
+
+def _copy(src, dst, algorithms, buffer_size, progress, filesize):
+    """Copy src to dst while hashing it, returning (bytes copied, hashes)."""
+    ring = hash_engine.buffer_ring(buffer_size)
+    in_flight = [(0, 0)] * len(ring)
+    copied = 0
+    slot = 0
+
+    # Workers even for one algorithm, so hashing does not hold up the next read
+    with hash_engine.ParallelHasher(algorithms, inline=False) as hasher:
+        writer = _Writer(dst, hash_engine.QUEUE_DEPTH)
+        writer.start()
+        try:
+            while True:
+                hashed, written = in_flight[slot]
+                hasher.wait(hashed)
+                writer.wait(written)
+                buffer = ring[slot]
+                n = src.readinto(buffer)
+                if not n:
+                    break
+
+                chunk = buffer if n == buffer_size else buffer[:n]
+                in_flight[slot] = (hasher.update(chunk), writer.put(chunk))
+                slot = (slot + 1) % len(ring)
+
+                copied += n
+                if progress:
+                    progress(copied, filesize)
+        finally:
+            writer.close()
+        if writer.error is not None:
+            raise writer.error
+        return copied, hasher.hexdigests()
+
+
+def _drop_cache(f):
+    """Evict written data from the page cache so a read-back comes from the disk."""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
+def copy_file(source, destination, algorithms=None, expected=None, verify=False, progress=None,
+              buffer_size=COPY_BUFFER_SIZE):
+    """
+    Copy a file and hash it with several algorithms in a single read pass.
+
+    The data is synced to disk before the destination appears. An existing
+    destination is replaced. File permissions and timestamps are copied as
+    with ``shutil.copy2``.
+
+    :param source: Path of the file to copy
+    :param destination: Path of the copy
+    :param algorithms: Algorithm names to compute (default: DEFAULT_ALGORITHMS,
+                       or hash_engine.preferred_algorithms for ``expected``)
+    :param expected: Optional normalized hex hash; on a mismatch the copy is
+                     discarded and no read-back is done. Without ``algorithms``,
+                     the opt-in candidates are computed from the copy only
+                     when no preferred one matched.
+    :param verify: Read the written data back, bypassing the page cache where
+                   possible, and compare its digests with the source's
+    :param progress: Optional callable receiving (bytes_copied, filesize)
+    :param buffer_size: Size of each read and write in bytes
+    :return: CopyResult; ``match`` is the algorithm that matched ``expected``
+             (None without one or on a mismatch) and ``verified`` the outcome
+             of the read-back (None without one). The destination only exists
+             if neither failed.
+    :raise OSError: If the source cannot be read or the copy cannot be written
+    """
+    temporary = destination + ".tmp"
+    filesize = os.path.getsize(source)
+    fallback = expected is not None and not algorithms
+    if fallback:
+        algorithms = hash_engine.preferred_algorithms(expected)
+    try:
+        with open(source, 'rb') as src, open(temporary, 'wb') as dst:
+            size, hashes = _copy(src, dst, algorithms, buffer_size, progress, filesize)
+            dst.flush()
+            os.fsync(dst.fileno())
+            if verify:
+                _drop_cache(dst)
+
+        match = hash_engine.match_hash(expected, hashes) if expected is not None else None
+        remaining = hash_engine.remaining_algorithms(expected, hashes) if fallback and match is None else None
+        if remaining:
+            # The copy is what gets published, so a match on it is good enough
+            hashes.update(hash_engine.hash_file(temporary, remaining, buffer_size=buffer_size))
+            match = hash_engine.match_hash(expected, hashes)
+        if expected is not None and match is None:
+            os.remove(temporary)
+            return CopyResult(size, hashes, None, None)
+
+        verified = None
+        if verify:
+            verified = hash_engine.hash_file(temporary, list(hashes), buffer_size=buffer_size,
+                                             io_policy="direct") == hashes
+            if not verified:
+                os.remove(temporary)
+                return CopyResult(size, hashes, match, False)
+
+        shutil.copystat(source, temporary)
+        os.replace(temporary, destination)
+        return CopyResult(size, hashes, match, verified)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,155 @@
+"""
+Duplicate file finder for Hash Verifier.
+
+Hashing every file in full is wasted work when most files have a unique
+size or differ in their first bytes. Candidates are narrowed down in
+stages, and only files that still collide are read completely:
+
+1. group files by size, dropping hard links to the same inode
+2. hash a small sample from the head and tail of every remaining file
+3. fully hash the files whose samples still collide
+
+Stages 2 and 3 run across a process pool; stage 3 goes through hash_batch
+and therefore also uses the digest cache.
+"""
+import os
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import hash_batch
+import hash_engine
+
+# Constants
+SAMPLE_SIZE = 64 * 1024  # Bytes read from each end of a file in stage 2
+SAMPLE_BATCH = 256  # Files per sample job sent to a worker
+
+DuplicateGroup = collections.namedtuple("DuplicateGroup", "size digest paths reclaimable")
+
+
+def sample_digest(filepath, size, algorithm="SHA-256", sample_size=SAMPLE_SIZE):
+    """
+    Hash the head and tail of a file.
+
+    Files of up to two samples are hashed completely, so their sample
+    digest is also their full digest.
+
+    :param filepath: Path of the file
+    :param size: Size of the file in bytes
+    :param algorithm: Algorithm name
+    :param sample_size: Bytes read from each end
+    :return: Hex digest
+    """
+    hasher = hash_engine.ALGORITHMS[algorithm]()
+    with open(filepath, 'rb') as f:
+        if size <= 2 * sample_size:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(sample_size))
+            f.seek(size - sample_size)
+            hasher.update(f.read(sample_size))
+    return hasher.hexdigest()
+
+
+def _sample_batch(batch, algorithm, sample_size):
+    """Worker entry point: sample every file of a batch."""
+    results = []
+    for filepath, size in batch:
+        try:
+            results.append((filepath, sample_digest(filepath, size, algorithm, sample_size), None))
+        except OSError as e:
+            results.append((filepath, None, e.strerror or str(e)))
+    return results
+
+
+def group_by_size(files, min_size=1):
+    """
+    Stage 1: group files by size.
+
+    Paths that point to an inode already seen (hard links, symlinks) are
+    dropped because removing them reclaims nothing.
+
+    :param files: Iterable of file paths
+    :param min_size: Ignore files smaller than this
+    :return: Dictionary mapping size to a list of paths, only sizes shared by several files
+    """
+    by_size = collections.defaultdict(list)
+    seen = set()
+    for filepath in files:
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            continue
+        if st.st_size < min_size or (st.st_dev, st.st_ino) in seen:
+            continue
+        seen.add((st.st_dev, st.st_ino))
+        by_size[st.st_size].append(filepath)
+    return {size: paths for size, paths in by_size.items() if len(paths) > 1}
+
+
+def _collisions(groups):
+    """Keep only groups with more than one member."""
+    return {key: paths for key, paths in groups.items() if len(paths) > 1}
+
+
+def find_duplicates(paths, algorithm="SHA-256", min_size=1, sample_size=SAMPLE_SIZE, workers=None,
+                    cache=None, errors=None, stats=None):
+    """
+    Find files with identical content.
+
+    :param paths: Files and directories to search
+    :param algorithm: Algorithm used for the sample and full digests
+    :param min_size: Ignore files smaller than this
+    :param sample_size: Bytes sampled from each end of a file in stage 2
+    :param workers: Number of worker processes (default: CPU count)
+    :param cache: Optional hash_cache.DigestCache for the full digests
+    :param errors: Optional list that receives (path, error) for unreadable files
+    :param stats: Optional dictionary that receives the number of files left after each stage
+    :return: List of DuplicateGroup, largest reclaimable first
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = stats if stats is not None else {}
+
+    by_size = group_by_size(hash_batch.iter_files(paths), min_size)
+    stats["size_candidates"] = sum(len(group) for group in by_size.values())
+
+    # Stage 2: head and tail samples
+    jobs = [(filepath, size) for size, group in by_size.items() for filepath in group]
+    by_sample = collections.defaultdict(list)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        batches = [jobs[i:i + SAMPLE_BATCH] for i in range(0, len(jobs), SAMPLE_BATCH)]
+        futures = [pool.submit(_sample_batch, batch, algorithm, sample_size) for batch in batches]
+        sizes = dict(jobs)
+        for future in futures:
+            for filepath, digest, error in future.result():
+                if error:
+                    if errors is not None:
+                        errors.append((filepath, error))
+                    continue
+                by_sample[sizes[filepath], digest].append(filepath)
+    by_sample = _collisions(by_sample)
+    stats["sample_candidates"] = sum(len(group) for group in by_sample.values())
+
+    # Small files were read completely in stage 2 and are already final
+    final = {key: group for key, group in by_sample.items() if key[0] <= 2 * sample_size}
+    todo = [(filepath, size) for (size, _), group in by_sample.items() if size > 2 * sample_size
+            for filepath in group]
+    stats["fully_hashed"] = len(todo)
+
+    # Stage 3: full digests of the files that still collide
+    sizes = dict(todo)
+    by_digest = collections.defaultdict(list)
+    results = hash_batch.hash_files((filepath for filepath, _ in todo), [algorithm], workers=workers, cache=cache)
+    for filepath, hashes, error in results if todo else ():
+        if error:
+            if errors is not None:
+                errors.append((filepath, error))
+            continue
+        by_digest[sizes[filepath], hashes[algorithm]].append(filepath)
+    final.update(_collisions(by_digest))
+
+    groups = [
+        DuplicateGroup(size, digest, sorted(group), size * (len(group) - 1))
+        for (size, digest), group in final.items()
+    ]
+    groups.sort(key=lambda group: (-group.reclaimable, group.paths[0]))
+    return groups
@@ -0,0 +1,849 @@
+"""
+Hashing engine used by Hash Verifier.
+
+The file is read once and every chunk is handed to one worker thread per
+algorithm, so the total time is bound by the slowest digest instead of the
+sum of all of them. hashlib releases the GIL while digesting large buffers,
+which lets the workers run in parallel on separate cores.
+
+Two read backends are available. ``readinto`` reads into a small ring of
+preallocated buffers that are recycled once every worker has consumed them,
+and ``mmap`` maps regular files and hands out slices of the mapping without
+copying. ``auto`` picks one based on the file type and size.
+
+An I/O policy controls the page cache while reading: ``sequential`` asks
+the kernel for aggressive read-ahead, ``nocache`` additionally drops every
+chunk from the cache once it has been read so bulk jobs do not evict the
+rest of the host's working set, and ``direct`` bypasses the cache with
+O_DIRECT and aligned buffers. ``normal`` leaves everything to the kernel.
+
+Sparse files are read region by region where the platform supports
+SEEK_DATA/SEEK_HOLE. Holes are never read from disk; the workers are fed a
+shared block of zeros instead, which gives the same digests.
+
+gzip, xz and bzip2 files can be hashed as their decompressed payload. A
+separate thread decompresses into a bounded queue while the digests are
+computed, so decompression and hashing overlap.
+"""
+import os
+import re
+import abc
+import sys
+import bz2
+import gzip
+import lzma
+import zlib
+import mmap
+import errno
+import stat
+import queue
+import hashlib
+import threading
+import time
+import io
+
+# Constants
+BUFFER_SIZE = 65536  # 64KB
+QUEUE_DEPTH = 16  # Chunks each worker may lag behind the reader
+RING_BYTES = 16 * 1024 * 1024  # Upper bound for the readinto buffers of one file
+MMAP_MIN_SIZE = 16 * 1024 * 1024  # Smaller files are cheaper to read directly
+ZERO_BLOCK = 1024 * 1024  # Size of each chunk of zeros fed in for a hole
+
+READAHEAD_BYTES = 8 * 1024 * 1024  # Window announced with WILLNEED and dropped with DONTNEED
+DIRECT_ALIGNMENT = 4096  # Buffer, offset and size alignment for O_DIRECT
+
+READ_BACKENDS = ("auto", "readinto", "mmap")
+# Force a backend for every read, e.g. to compare them
+READ_BACKEND = os.environ.get("HASH_VERIFIER_BACKEND", "auto")
+
+IO_POLICIES = ("normal", "sequential", "nocache", "direct")
+# Page cache policy for every read, e.g. to measure its effect
+IO_POLICY = os.environ.get("HASH_VERIFIER_IO_POLICY", "normal")
+
+# Algorithm registry, filled by register_algorithm() below. Every front end
+# builds its lists from these, so a new digest only needs to be registered.
+ALGORITHMS = {}  # Name -> hashlib-style constructor, in display order
+DEFAULT_ALGORITHMS = []  # Computed when no algorithms are requested
+SUM_TAGS = {}  # Name -> tag used by BSD-style ("SHA256 (file) = ...") lines
+HASH_LENGTHS = {}  # Hex digest length -> algorithms that produce it
+_ALIASES = {}  # Normalized alternative name -> name
+
+
+def _name_key(name):
+    return name.replace("-", "").replace("_", "").upper()
+
+
+def register_algorithm(name, factory, tag=None, default=False, aliases=()):
+    """
+    Make a digest available to the engine, the GUI and the command line.
+
+    :param name: Display name, e.g. "SHA-256"
+    :param factory: Callable returning a new hash object with update() and hexdigest()
+    :param tag: Tag for BSD-style checksum lines (default: name without dashes)
+    :param default: Compute it when no algorithms are requested
+    :param aliases: Other names accepted by resolve_algorithm()
+    """
+    length = len(factory().hexdigest())
+    ALGORITHMS[name] = factory
+    SUM_TAGS[name] = tag or name.replace("-", "")
+    HASH_LENGTHS[length] = HASH_LENGTHS.get(length, ()) + (name,)
+    if default:
+        DEFAULT_ALGORITHMS.append(name)
+    for alias in (name, *aliases):
+        _ALIASES[_name_key(alias)] = name
+
+
+register_algorithm("MD5", hashlib.md5, default=True)
+register_algorithm("SHA-1", hashlib.sha1, default=True)
+register_algorithm("SHA-256", hashlib.sha256, default=True)
+register_algorithm("SHA-512", hashlib.sha512, default=True)
+register_algorithm("SHA3-256", hashlib.sha3_256, "SHA3-256", default=True)
+register_algorithm("SHA-224", hashlib.sha224)
+register_algorithm("SHA-384", hashlib.sha384)
+register_algorithm("SHA3-512", hashlib.sha3_512, "SHA3-512")
+# BLAKE2 is much faster than SHA-256 on CPUs without SHA extensions
+register_algorithm("BLAKE2b", hashlib.blake2b, "BLAKE2b", aliases=("B2", "BLAKE2", "BLAKE2b-512"))
+register_algorithm("BLAKE2s", hashlib.blake2s, "BLAKE2s", aliases=("BLAKE2s-256",))
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+if xxhash is not None:
+    # Not cryptographic, but fast enough to keep up with NVMe drives
+    register_algorithm("XXH3-64", xxhash.xxh3_64, "XXH3", aliases=("XXH3",))
+    register_algorithm("XXH3-128", xxhash.xxh3_128, "XXH128", aliases=("XXH128",))
+
+# Magic bytes -> (name, opener wrapping a binary file) of the supported compressed formats
+COMPRESSIONS = {
+    b"\x1f\x8b": ("gzip", lambda f: gzip.GzipFile(fileobj=f)),
+    b"\xfd7zXZ\x00": ("xz", lzma.LZMAFile),
+    b"BZh": ("bzip2", bz2.BZ2File),
+}
+COMPRESSED_SUFFIXES = (".gz", ".xz", ".bz2")
+
+_STOP = object()
+_ZEROS = memoryview(bytes(ZERO_BLOCK))  # Read-only, so every worker can share it
+
+
+class QueueConsumer(threading.Thread, metaclass=abc.ABCMeta):
+    """
+    Thread that hands queued chunks to ``consume`` in order.
+
+    Chunks are put on the ``chunks`` queue. Every chunk is counted in
+    ``done`` under the shared ``consumed`` condition once it has been dealt
+    with, which is what lets the reader recycle its buffer. A failure is
+    kept in ``error`` and the queue is still drained, so the reader never
+    blocks forever. Subclasses implement ``consume``.
+    """
+
+    def __init__(self, name, queue_depth, consumed, timed=False):
+        """
+        :param name: Thread name
+        :param queue_depth: Chunks queued before ``chunks.put`` blocks
+        :param consumed: threading.Condition notified after every chunk,
+                         may be shared by several consumers
+        :param timed: Measure time spent in ``consume`` and waiting in
+                      ``busy_ns`` and ``idle_ns``
+        """
+        super().__init__(name=name, daemon=True)
+        self.chunks = queue.Queue(maxsize=queue_depth)
+        self.consumed = consumed
+        self.done = 0
+        self.error = None
+        self.timed = timed
+        self.busy_ns = 0
+        self.idle_ns = 0
+
+    @abc.abstractmethod
+    def consume(self, data):
+        """
+        Deal with one chunk, called from the thread.
+
+        :param data: Bytes-like object that is only valid during the call
+        """
+
+    def run(self):
+        clock = time.perf_counter_ns
+        while True:
+            if self.timed:
+                start = clock()
+                data = self.chunks.get()
+                self.idle_ns += clock() - start
+            else:
+                data = self.chunks.get()
+            if data is _STOP:
+                break
+            if self.error is None:
+                try:
+                    if self.timed:
+                        start = clock()
+                        self.consume(data)
+                        self.busy_ns += clock() - start
+                    else:
+                        self.consume(data)
+                except Exception as e:
+                    self.error = e
+            del data
+            with self.consumed:
+                self.done += 1
+                self.consumed.notify_all()
+
+    def stop(self):
+        """Let the thread finish once everything queued so far is consumed."""
+        self.chunks.put(_STOP)
+
+
+class _DigestWorker(QueueConsumer):
+    """Thread that feeds queued chunks into a single hash object."""
+
+    def __init__(self, algorithm, queue_depth, consumed, timed=False):
+        super().__init__(f"hash-{algorithm}", queue_depth, consumed, timed)
+        self.hasher = ALGORITHMS[algorithm]()
+
+    def consume(self, data):
+        self.hasher.update(data)
+
+
+class ParallelHasher:
+    """
+    Compute several digests of the same byte stream concurrently.
+
+    Each algorithm gets its own worker and a bounded queue. ``update`` blocks
+    once the slowest worker is ``queue_depth`` chunks behind, which keeps
+    memory usage bounded regardless of the file size. A single algorithm is
+    hashed inline on the calling thread, where workers would only add overhead.
+    """
+
+    def __init__(self, algorithms=None, queue_depth=QUEUE_DEPTH, profile=None, inline=True):
+        """
+        :param algorithms: Algorithm names to compute (default: DEFAULT_ALGORITHMS)
+        :param queue_depth: Maximum number of pending chunks per worker
+        :param profile: Optional hash_profile.HashProfile that receives queue
+                        stalls and the time spent per algorithm
+        :param inline: Hash a single algorithm on the calling thread. Pass
+                       False when that thread has other work to overlap with.
+        """
+        names = list(algorithms or DEFAULT_ALGORITHMS)
+        unknown = [name for name in names if name not in ALGORITHMS]
+        if unknown:
+            raise ValueError(f"Unsupported algorithm: {', '.join(unknown)}")
+
+        self._consumed = threading.Condition()
+        self._submitted = 0
+        self._closed = False
+        self.profile = profile
+
+        if len(names) == 1 and inline:
+            self.inline = ALGORITHMS[names[0]]()
+            self.algorithm = names[0]
+            self.workers = {}
+            return
+
+        self.inline = None
+        self.workers = {name: _DigestWorker(name, queue_depth, self._consumed, profile is not None) for name in names}
+        for worker in self.workers.values():
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def update(self, data):
+        """
+        Queue a chunk for every algorithm.
+
+        The chunk is shared by all workers, so its contents must not change
+        until ``wait`` has returned for the sequence number it was given.
+
+        :param data: Bytes-like object to hash
+        :return: Sequence number of the chunk
+        """
+        if self.profile is not None:
+            return self._timed_update(data)
+        if self.inline:
+            self.inline.update(data)
+        for worker in self.workers.values():
+            worker.chunks.put(data)
+        self._submitted += 1
+        return self._submitted
+
+    def _timed_update(self, data):
+        start = time.perf_counter_ns()
+        if self.inline:
+            self.inline.update(data)
+            self.profile.digest_ns[self.algorithm] = \
+                self.profile.digest_ns.get(self.algorithm, 0) + time.perf_counter_ns() - start
+        else:
+            # put only blocks when a worker's queue is full
+            for worker in self.workers.values():
+                worker.chunks.put(data)
+            self.profile.stall_ns += time.perf_counter_ns() - start
+        self._submitted += 1
+        return self._submitted
+
+    def wait(self, sequence):
+        """
+        Block until every worker has consumed a chunk.
+
+        :param sequence: Sequence number returned by ``update``
+        """
+        start = time.perf_counter_ns() if self.profile is not None else 0
+        with self._consumed:
+            self._consumed.wait_for(
+                lambda: all(worker.done >= sequence for worker in self.workers.values())
+            )
+        if self.profile is not None:
+            self.profile.stall_ns += time.perf_counter_ns() - start
+
+    def close(self):
+        """Stop all workers and wait for them to finish."""
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self.workers.values():
+            worker.stop()
+        for worker in self.workers.values():
+            worker.join()
+        if self.profile is not None:
+            for name, worker in self.workers.items():
+                self.profile.digest_ns[name] = worker.busy_ns
+                self.profile.idle_ns[name] = worker.idle_ns
+
+    def hexdigests(self):
+        """
+        Finish hashing and return the results.
+
+        :return: Dictionary mapping algorithm name to hex digest
+        """
+        self.close()
+        if self.inline:
+            return {self.algorithm: self.inline.hexdigest()}
+        for worker in self.workers.values():
+            if worker.error is not None:
+                raise worker.error
+        return {name: worker.hasher.hexdigest() for name, worker in self.workers.items()}
+
+
+def resolve_algorithm(name):
+    """
+    Map a user supplied name such as "sha256" to its canonical spelling.
+
+    :param name: Algorithm name in any case, with or without dashes
+    :return: Key of ALGORITHMS
+    """
+    algorithm = _ALIASES.get(_name_key(name))
+    if algorithm is None:
+        raise ValueError(f"Unsupported algorithm: {name}")
+    return algorithm
+
+
+def normalize_hash(value):
+    """
+    Lowercase a hash and strip whitespace, colons and dashes.
+
+    :param value: Hash as pasted by the user
+    :return: Normalized hash string
+    """
+    return re.sub(r'[\s:\-]', '', value.strip().lower())
+
+
+def algorithms_for_hash(expected):
+    """
+    Detect which algorithms could have produced a hash.
+
+    :param expected: Normalized hex hash
+    :return: Tuple of algorithm names, empty if the length is unknown
+    """
+    return HASH_LENGTHS.get(len(expected), ())
+
+
+def preferred_algorithms(expected):
+    """
+    Pick the algorithms to compute first for an expected hash.
+
+    Several digests share a length, e.g. SHA-256, SHA3-256 and BLAKE2s. The
+    ones in DEFAULT_ALGORITHMS are tried first; the opt-in ones are only
+    worth computing when none of those matched.
+
+    :param expected: Normalized hex hash
+    :return: Tuple of algorithm names, empty if the length is unknown
+    """
+    candidates = algorithms_for_hash(expected)
+    return tuple(name for name in candidates if name in DEFAULT_ALGORITHMS) or candidates
+
+
+def remaining_algorithms(expected, hashes):
+    """
+    Candidates for an expected hash that have not been computed yet.
+
+    :param expected: Normalized hex hash
+    :param hashes: Dictionary mapping algorithm name to hex digest
+    :return: List of algorithm names, empty once every candidate is known
+    """
+    return [name for name in algorithms_for_hash(expected) if name not in hashes]
+
+
+def match_hash(expected, hashes):
+    """
+    Compare an expected hash against computed ones.
+
+    :param expected: Normalized hex hash
+    :param hashes: Dictionary mapping algorithm name to hex digest
+    :return: Name of the matching algorithm, or None
+    """
+    for algorithm in algorithms_for_hash(expected):
+        if hashes.get(algorithm, "").lower() == expected:
+            return algorithm
+    return None
+
+
+def check_settings():
+    """
+    Validate the settings taken from environment variables.
+
+    Front ends call this at startup, so a typo is reported once instead of
+    as a traceback from every read.
+
+    :raise ValueError: If HASH_VERIFIER_BACKEND is not one of READ_BACKENDS
+                       or HASH_VERIFIER_IO_POLICY not one of IO_POLICIES
+    """
+    if READ_BACKEND not in READ_BACKENDS:
+        raise ValueError(f"HASH_VERIFIER_BACKEND must be one of {', '.join(READ_BACKENDS)}, "
+                         f"not {READ_BACKEND!r}")
+    if IO_POLICY not in IO_POLICIES:
+        raise ValueError(f"HASH_VERIFIER_IO_POLICY must be one of {', '.join(IO_POLICIES)}, "
+                         f"not {IO_POLICY!r}")
+
+
+def select_backend(filepath, backend="auto"):
+    """
+    Choose the read backend for a file.
+
+    :param filepath: Path of the file to hash
+    :param backend: One of READ_BACKENDS
+    :return: "readinto" or "mmap"
+    """
+    if backend not in READ_BACKENDS:
+        raise ValueError(f"Unknown read backend: {backend}")
+    if backend != "auto":
+        return backend
+
+    st = os.stat(filepath)
+    # 32-bit builds cannot map large files into their address space
+    if stat.S_ISREG(st.st_mode) and st.st_size >= MMAP_MIN_SIZE and sys.maxsize > 2**32:
+        return "mmap"
+    return "readinto"
+
+
+class _IOPolicy:
+    """Page cache hints for reading one file, see IO_POLICIES."""
+
+    def __init__(self, fd, policy="normal"):
+        if policy not in IO_POLICIES:
+            raise ValueError(f"Unknown I/O policy: {policy}")
+        self.fd = fd
+        self.direct = policy == "direct"
+        self.advise = policy in ("sequential", "nocache") and hasattr(os, "posix_fadvise")
+        self.drop = self.advise and policy == "nocache"
+        self.ahead = 0  # End of the range announced with WILLNEED
+        self.dropped = 0  # Start of the range not yet dropped from the cache
+        if self.advise:
+            self._fadvise(0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    def _fadvise(self, offset, length, advice):
+        try:
+            os.posix_fadvise(self.fd, offset, length, advice)
+        except OSError:
+            self.advise = self.drop = False  # Pipes and some file systems refuse hints
+
+    def reading(self, position):
+        """Announce the next window before reading at ``position``."""
+        if self.advise and position + READAHEAD_BYTES // 2 >= self.ahead:
+            self._fadvise(position, READAHEAD_BYTES, os.POSIX_FADV_WILLNEED)
+            self.ahead = position + READAHEAD_BYTES
+
+    def read(self, position):
+        """Everything before ``position`` has been copied into our buffers."""
+        if self.drop and position - self.dropped >= READAHEAD_BYTES:
+            self._fadvise(self.dropped, position - self.dropped, os.POSIX_FADV_DONTNEED)
+            self.dropped = position
+
+    def finish(self):
+        if self.drop:
+            self._fadvise(self.dropped, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _open_direct(filepath):
+    """Open a file with O_DIRECT, or return None if that is not supported."""
+    if not hasattr(os, "O_DIRECT"):
+        return None
+    try:
+        fd = os.open(filepath, os.O_RDONLY | os.O_DIRECT)
+    except OSError:
+        return None  # e.g. tmpfs and some network file systems
+    return io.FileIO(fd, 'rb')
+
+
+def buffer_ring(buffer_size, aligned=False):
+    """
+    Preallocate read buffers to be recycled in turn.
+
+    Large blocks get fewer buffers, so memory use stays bounded.
+
+    :param buffer_size: Size of each buffer in bytes
+    :param aligned: Page-align the buffers, as O_DIRECT requires
+    :return: List of at least two writable memoryviews
+    """
+    count = max(2, min(QUEUE_DEPTH, RING_BYTES // buffer_size))
+    if aligned:
+        # Anonymous mappings are page aligned, as O_DIRECT requires
+        memory = memoryview(mmap.mmap(-1, buffer_size * count))
+        return [memory[i * buffer_size:(i + 1) * buffer_size] for i in range(count)]
+    return [memoryview(bytearray(buffer_size)) for _ in range(count)]
+
+
+def _read_readinto(f, hasher, buffer_size, follow=None, stats=None, policy=None):
+    """Read into a ring of reusable buffers, yielding the running byte count."""
+    ring = buffer_ring(buffer_size, policy and policy.direct)
+    in_flight = [0] * len(ring)
+    bytes_read = 0
+    slot = 0
+
+    while True:
+        # Reuse a buffer only after every worker is done with its last chunk
+        hasher.wait(in_flight[slot])
+        buffer = ring[slot]
+        if policy:
+            policy.reading(bytes_read)
+        n = f.readinto(buffer)
+        if not n:
+            # A followed file may still grow; wait for more data or completion
+            if follow and follow.wait(f, bytes_read):
+                continue
+            break
+
+        in_flight[slot] = hasher.update(buffer if n == buffer_size else buffer[:n])
+        slot = (slot + 1) % len(ring)
+
+        bytes_read += n
+        if policy:
+            policy.read(bytes_read)
+        yield bytes_read
+
+
+def _read_mmap(f, hasher, buffer_size, follow=None, stats=None, policy=None):
+    """Hash slices of a read-only mapping, yielding the running byte count."""
+    filesize = os.fstat(f.fileno()).st_size
+    if filesize == 0:
+        return  # Empty files cannot be mapped
+
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        if hasattr(mapping, "madvise"):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapping)
+        try:
+            for offset in range(0, filesize, buffer_size):
+                hasher.update(view[offset:offset + buffer_size])
+                yield min(offset + buffer_size, filesize)
+        finally:
+            # The mapping cannot be closed while a worker still holds a slice
+            hasher.close()
+            view.release()
+
+
+def has_holes(filepath):
+    """
+    Whether a file is sparse and the platform can find its holes.
+
+    :param filepath: Path of the file
+    :return: True if fewer blocks are allocated than the size needs
+    """
+    if not hasattr(os, "SEEK_DATA"):
+        return False
+    st = os.stat(filepath)
+    return stat.S_ISREG(st.st_mode) and getattr(st, "st_blocks", None) is not None \
+        and st.st_blocks * 512 < st.st_size
+
+
+def data_regions(fd, size):
+    """
+    Split a file into data and hole regions with SEEK_DATA/SEEK_HOLE.
+
+    File systems without hole support report the whole file as data.
+
+    :param fd: File descriptor
+    :param size: Size of the file in bytes
+    :return: Iterator of (offset, length, is_data)
+    """
+    offset = 0
+    while offset < size:
+        try:
+            data = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                data = size  # Only a hole is left
+            elif e.errno == errno.EINVAL:
+                yield offset, size - offset, True  # Not supported here
+                return
+            else:
+                raise
+        data = min(data, size)
+        if data > offset:
+            yield offset, data - offset, False
+        if data >= size:
+            return
+        hole = min(os.lseek(fd, data, os.SEEK_HOLE), size)
+        yield data, hole - data, True
+        offset = hole
+
+
+def _read_sparse(f, hasher, buffer_size, follow=None, stats=None, policy=None):
+    """Read only the data regions and feed zeros for holes, yielding the running byte count."""
+    ring = buffer_ring(buffer_size)
+    in_flight = [0] * len(ring)
+    slot = 0
+    position = 0
+    skipped = 0
+
+    fd = f.fileno()
+    for offset, length, is_data in data_regions(fd, os.fstat(fd).st_size):
+        end = offset + length
+        if not is_data:
+            while position < end:
+                n = min(ZERO_BLOCK, end - position)
+                hasher.update(_ZEROS[:n])
+                position += n
+                skipped += n
+                yield position
+            continue
+
+        f.seek(offset)
+        while position < end:
+            hasher.wait(in_flight[slot])
+            buffer = ring[slot]
+            if policy:
+                policy.reading(position)
+            n = f.readinto(buffer[:min(buffer_size, end - position)])
+            if not n:
+                break  # Truncated while hashing
+            in_flight[slot] = hasher.update(buffer[:n])
+            slot = (slot + 1) % len(ring)
+            position += n
+            if policy:
+                policy.read(position)
+            yield position
+
+    if stats is not None:
+        stats["sparse_bytes"] = skipped
+
+
+def compression_of(filepath):
+    """
+    Detect a compressed file from its first bytes.
+
+    :param filepath: Path of the file
+    :return: "gzip", "xz", "bzip2", or None for anything else
+    """
+    with open(filepath, 'rb') as f:
+        head = f.read(6)
+    for magic, (name, _) in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def _decompress(f, opener, buffer_size, chunks, failure, stop):
+    """Decompression thread: queue decompressed chunks, then None."""
+    try:
+        with opener(f) as stream:
+            while not stop.is_set():
+                data = stream.read(buffer_size)
+                if not data:
+                    break
+                chunks.put((data, f.tell()))
+    except Exception as e:
+        failure.append(e)  # Raised again on the hashing side
+    finally:
+        chunks.put(None)
+
+
+def _read_decompressed(f, hasher, buffer_size, follow=None, stats=None, policy=None):
+    """Hash the decompressed payload, yielding the position in the compressed file."""
+    head = f.read(6)
+    f.seek(0)
+    opener = next(cls for magic, (_, cls) in COMPRESSIONS.items() if head.startswith(magic))
+
+    # Every chunk is a new bytes object, so nothing has to wait for the workers to recycle it
+    chunks = queue.Queue(maxsize=QUEUE_DEPTH)
+    failure = []
+    stop = threading.Event()
+    thread = threading.Thread(target=_decompress, args=(f, opener, buffer_size, chunks, failure, stop),
+                              name="decompress", daemon=True)
+    thread.start()
+    payload = 0
+    try:
+        while True:
+            item = chunks.get()
+            if item is None:
+                break
+            data, position = item
+            hasher.update(data)
+            payload += len(data)
+            if policy:
+                policy.read(position)
+            yield position
+    finally:
+        # Unblock the thread if hashing stopped early
+        stop.set()
+        while thread.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+
+    if failure:
+        error = failure[0]
+        if isinstance(error, (EOFError, lzma.LZMAError, zlib.error)):
+            raise OSError(errno.EIO, f"Corrupt compressed data: {error}")
+        raise error
+    if stats is not None:
+        stats["decompressed_bytes"] = payload
+
+
+_READERS = {
+    "readinto": _read_readinto,
+    "mmap": _read_mmap,
+}
+
+
+class _TimedFile:
+    """File wrapper that adds the time spent in ``read`` and ``readinto`` to a profile."""
+
+    def __init__(self, f, profile):
+        self._f = f
+        self._profile = profile
+
+    def read(self, size=-1):
+        start = time.perf_counter_ns()
+        data = self._f.read(size)
+        self._profile.read_ns += time.perf_counter_ns() - start
+        self._profile.reads += 1
+        self._profile.read_bytes += len(data)
+        return data
+
+    def readinto(self, buffer):
+        start = time.perf_counter_ns()
+        n = self._f.readinto(buffer)
+        self._profile.read_ns += time.perf_counter_ns() - start
+        self._profile.reads += 1
+        self._profile.read_bytes += n or 0
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def hash_file(filepath, algorithms=None, progress=None, buffer_size=BUFFER_SIZE, backend=None, follow=None,
+              stats=None, io_policy=None, profile=None, decompress=False):
+    """
+    Hash a file with several algorithms in a single read pass.
+
+    :param filepath: Path of the file to hash
+    :param algorithms: Algorithm names to compute (default: DEFAULT_ALGORITHMS)
+    :param progress: Optional callable receiving (bytes_read, filesize)
+    :param buffer_size: Size of each read in bytes
+    :param backend: One of READ_BACKENDS (default: READ_BACKEND)
+    :param follow: Optional object whose ``wait(f, position)`` is called at
+                   end of file and returns True once more data was appended,
+                   see hash_follow.GrowthWatcher. Implies the readinto backend.
+    :param stats: Optional dictionary that receives ``sparse_bytes``, the
+                  number of hole bytes that were not read from disk
+    :param io_policy: One of IO_POLICIES (default: IO_POLICY). Any policy
+                      but ``normal`` implies the readinto backend.
+    :param profile: Optional hash_profile.HashProfile that receives timings.
+                    With the mmap backend the reads happen as page faults
+                    inside the digests and are counted there.
+    :param decompress: Hash the decompressed payload of gzip, xz and bzip2
+                       files; ``stats`` then also receives ``decompressed_bytes``.
+                       Other files are hashed as they are.
+    :return: Dictionary mapping algorithm name to hex digest
+    """
+    started = time.perf_counter_ns() if profile is not None else 0
+    backend = backend or READ_BACKEND
+    io_policy = io_policy or IO_POLICY
+    if io_policy not in IO_POLICIES:
+        raise ValueError(f"Unknown I/O policy: {io_policy}")
+
+    if decompress and follow:
+        raise ValueError("A growing file cannot be decompressed")
+    decompress = decompress and compression_of(filepath) is not None
+    if decompress and io_policy == "direct":
+        io_policy = "nocache"  # The decompressor reads at unaligned offsets
+
+    f = None
+    if io_policy == "direct" and not follow:
+        # Reads must stay aligned, which rules out hole skipping and following
+        f = _open_direct(filepath)
+        buffer_size = -(-buffer_size // DIRECT_ALIGNMENT) * DIRECT_ALIGNMENT
+    if f is None and io_policy == "direct":
+        io_policy = "nocache"  # Closest thing where O_DIRECT is unavailable
+
+    if decompress:
+        reader = _read_decompressed
+    elif follow or f is not None:
+        reader = _read_readinto
+    elif backend != "mmap" and has_holes(filepath):
+        reader = _read_sparse
+    elif io_policy != "normal":
+        reader = _read_readinto
+    else:
+        reader = _READERS[select_backend(filepath, backend)]
+    filesize = os.path.getsize(filepath)
+    stats = stats if stats is not None else {}
+    stats["sparse_bytes"] = 0
+
+    with ParallelHasher(algorithms, profile=profile) as hasher, f or open(filepath, 'rb') as f:
+        policy = _IOPolicy(f.fileno(), io_policy) if io_policy != "normal" else None
+        bytes_read = 0
+        for bytes_read in reader(_TimedFile(f, profile) if profile else f, hasher, buffer_size, follow, stats, policy):
+            if progress:
+                progress(bytes_read, max(filesize, follow.size if follow else 0))
+        if policy:
+            policy.finish()
+
+        hashes = hasher.hexdigests()
+        if profile is not None:
+            profile.bytes = stats.get("decompressed_bytes", bytes_read)  # What the digests saw
+            profile.wall_ns = time.perf_counter_ns() - started
+        return hashes
+
+
+def hash_stream(stream, algorithms=None, progress=None, buffer_size=BUFFER_SIZE, total=0, profile=None):
+    """
+    Hash a readable binary stream, such as an archive member, in one pass.
+
+    :param stream: Object with a ``readinto`` method
+    :param algorithms: Algorithm names to compute (default: DEFAULT_ALGORITHMS)
+    :param progress: Optional callable receiving (bytes_read, total)
+    :param buffer_size: Size of each read in bytes
+    :param total: Expected number of bytes for progress, 0 if unknown
+    :param profile: Optional hash_profile.HashProfile that receives timings
+    :return: Dictionary mapping algorithm name to hex digest
+    """
+    started = time.perf_counter_ns() if profile is not None else 0
+    with ParallelHasher(algorithms, profile=profile) as hasher:
+        bytes_read = 0
+        for bytes_read in _read_readinto(_TimedFile(stream, profile) if profile else stream, hasher, buffer_size):
+            if progress:
+                progress(bytes_read, total)
+
+        hashes = hasher.hexdigests()
+        if profile is not None:
+            profile.bytes = bytes_read
+            profile.wall_ns = time.perf_counter_ns() - started
+        return hashes
@@ -0,0 +1,90 @@
+"""
+Follow mode for Hash Verifier: hash a file while it is still being written.
+
+The engine keeps its hashers open at end of file and asks a GrowthWatcher
+whether more data is coming. The watcher polls the file size and reports
+completion once a sidecar marker appears or the size has not changed for a
+while, so the digests are ready as soon as the download finishes without a
+second full read.
+"""
+import os
+import time
+
+# Constants
+STABLE_TIMEOUT = 10.0  # Seconds without growth before the file counts as complete
+POLL_INTERVAL = 0.25  # Seconds between size checks
+PARTIAL_SUFFIXES = (".part", ".partial", ".crdownload", ".download")  # Renamed by browsers when done
+
+
+class GrowthWatcher:
+    """
+    Decide at end of file whether to wait for more data.
+
+    Completion is detected by the first of:
+      * ``done_marker`` exists, e.g. a ``.done`` file written by the downloader
+      * ``partial_marker`` no longer exists, e.g. the browser's ``.part`` file
+        that is renamed once the download completes
+      * the size has not changed for ``stable_timeout`` seconds
+    """
+
+    def __init__(self, stable_timeout=STABLE_TIMEOUT, done_marker=None, partial_marker=None,
+                 poll_interval=POLL_INTERVAL):
+        """
+        :param stable_timeout: Seconds without growth before giving up waiting
+        :param done_marker: Path whose appearance signals completion
+        :param partial_marker: Path whose disappearance signals completion
+        :param poll_interval: Seconds between size checks
+        """
+        self.stable_timeout = stable_timeout
+        self.done_marker = done_marker
+        self.partial_marker = partial_marker
+        self.poll_interval = poll_interval
+        self.size = 0
+
+    def finished(self):
+        """Whether a marker says the writer is done."""
+        if self.done_marker and os.path.exists(self.done_marker):
+            return True
+        if self.partial_marker and not os.path.exists(self.partial_marker):
+            return True
+        return False
+
+    def wait(self, f, position):
+        """
+        Block until the file grows past ``position`` or is complete.
+
+        :param f: File object being hashed
+        :param position: Bytes hashed so far
+        :return: True if there is more data to read, False when complete
+        """
+        stable_since = time.monotonic()
+        while True:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size > position:
+                return True
+            if self.size < position:
+                raise OSError("File was truncated while it was being hashed")
+
+            # Check the size once more after the marker to catch a final write
+            if self.finished():
+                self.size = os.fstat(f.fileno()).st_size
+                return self.size > position
+            if time.monotonic() - stable_since >= self.stable_timeout:
+                return False
+            time.sleep(self.poll_interval)
+
+
+def watcher_for(filepath, stable_timeout=STABLE_TIMEOUT, done_marker=None):
+    """
+    Build a GrowthWatcher for a file.
+
+    A file named like an in-progress browser download counts as complete as
+    soon as it is renamed; the open handle keeps reading the same data.
+
+    :param filepath: File being followed
+    :param stable_timeout: Seconds without growth before the file counts as complete
+    :param done_marker: Optional path whose appearance signals completion
+    :return: GrowthWatcher
+    """
+    partial = filepath if filepath.lower().endswith(PARTIAL_SUFFIXES) else None
+    return GrowthWatcher(stable_timeout, done_marker, partial)
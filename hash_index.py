@@ -0,0 +1,249 @@
+"""
+Indexed lookup of a file's entry in large checksum manifests.
+
+Vendors publish SHA256SUMS files with hundreds of thousands of lines, and
+the GUI needs exactly one of them: the line for the file being verified.
+The manifest is stream-parsed once and every entry is stored by base name
+in a small SQLite database next to the digest cache. The index is keyed on
+the manifest's device, inode, size and modification time, so an edited or
+replaced manifest is parsed again, and later lookups are a single indexed
+query.
+
+Small manifests are cheaper to scan than to index and are never stored.
+"""
+import os
+import sys
+import time
+import sqlite3
+
+import hash_cache
+import hash_manifest
+
+# Constants
+INDEX_MIN_SIZE = 256 * 1024  # Smaller manifests are scanned on every lookup
+MAX_MANIFESTS = 64  # Indexed manifests kept before evicting
+INSERT_BATCH = 10000  # Entries written per executemany call
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifests (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    manifest INTEGER NOT NULL,
+    basename TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    name TEXT NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lookup ON entries (manifest, basename);
+"""
+
+
+def default_index_path():
+    """
+    Location of the index database, next to the digest cache.
+
+    :return: Path of the SQLite file
+    """
+    return os.path.join(os.path.dirname(hash_cache.default_cache_path()), "manifests.sqlite3")
+
+
+def _split(name):
+    """Path components of a manifest name, ignoring ``./`` prefixes."""
+    if sys.platform == "win32":
+        name = name.replace("\\", "/")
+    return [part for part in name.split("/") if part not in ("", ".")]
+
+
+def _basename(name):
+    parts = _split(name)
+    return parts[-1] if parts else name
+
+
+def best_entries(entries, manifest, filepath):
+    """
+    Pick the entries describing a file among those with its base name.
+
+    A name that resolves to the file relative to the manifest's directory
+    wins; otherwise the first name listed is taken. Every algorithm listed
+    for the chosen name is returned.
+
+    :param entries: ManifestEntry candidates sharing the file's base name
+    :param manifest: Path of the manifest
+    :param filepath: File being verified
+    :return: List of ManifestEntry in manifest order
+    """
+    if not entries:
+        return []
+    base_dir = os.path.dirname(os.path.abspath(manifest))
+    target = os.path.normcase(os.path.abspath(filepath))
+
+    def resolves(name):
+        return os.path.normcase(os.path.join(base_dir, *_split(name))) == target
+
+    names = [entry.name for entry in entries]
+    chosen = next((name for name in names if resolves(name)), names[0])
+    return [entry for entry in entries if entry.name == chosen]
+
+
+def scan_entries(manifest, filepath):
+    """
+    Find a file's entries by streaming through a manifest, without an index.
+
+    :param manifest: Path of the manifest
+    :param filepath: File being verified
+    :return: List of ManifestEntry, empty if the file is not listed
+    """
+    basename = os.path.basename(filepath)
+    candidates = [entry for entry in hash_manifest.iter_entries(manifest) if _basename(entry.name) == basename]
+    return best_entries(candidates, manifest, filepath)
+
+
+class ManifestIndex:
+    """
+    SQLite backed index of manifest entries by base name.
+
+    A connection must only be used from the thread that created it.
+    """
+
+    def __init__(self, path=None, max_manifests=MAX_MANIFESTS):
+        """
+        :param path: Database file (default: default_index_path())
+        :param max_manifests: Number of manifests kept before evicting
+        """
+        self.path = path or default_index_path()
+        self.max_manifests = max_manifests
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Close the database connection."""
+        self.db.close()
+
+    def _indexed(self, path, st):
+        """Id of a manifest if its index is up to date, else None."""
+        row = self.db.execute(
+            "SELECT id, device, inode, size, mtime_ns FROM manifests WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or tuple(row[1:]) != hash_cache.stat_key(st):
+            return None
+        return row[0]
+
+    def build(self, manifest, st=None):
+        """
+        Stream-parse a manifest into the index, replacing older entries.
+
+        :param manifest: Path of the manifest
+        :param st: os.stat_result of the manifest (default: stat it now)
+        :return: Id of the manifest in the index
+        """
+        st = st or os.stat(manifest)
+        path = os.path.abspath(manifest)
+        insert = "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)"
+        with self.db:
+            self.db.execute(
+                "DELETE FROM entries WHERE manifest = (SELECT id FROM manifests WHERE path = ?)", (path,)
+            )
+            manifest_id = self.db.execute(
+                "INSERT OR REPLACE INTO manifests (path, device, inode, size, mtime_ns, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, *hash_cache.stat_key(st), time.time_ns())
+            ).lastrowid
+            rows = []
+            for entry in hash_manifest.iter_entries(manifest):
+                try:
+                    digest = bytes.fromhex(entry.digest)
+                except ValueError:
+                    continue  # Not a usable digest; a scan would never match it either
+                rows.append((manifest_id, _basename(entry.name), entry.algorithm, digest, entry.name, entry.line))
+                if len(rows) >= INSERT_BATCH:
+                    self.db.executemany(insert, rows)
+                    rows = []
+            self.db.executemany(insert, rows)
+        self.evict()
+        return manifest_id
+
+    def lookup(self, manifest, filepath):
+        """
+        Find a file's entries, indexing the manifest first if it changed.
+
+        :param manifest: Path of the manifest
+        :param filepath: File being verified
+        :return: List of ManifestEntry, empty if the file is not listed
+        """
+        st = os.stat(manifest)
+        manifest_id = self._indexed(os.path.abspath(manifest), st)
+        if manifest_id is None:
+            manifest_id = self.build(manifest, st)
+        else:
+            with self.db:
+                self.db.execute("UPDATE manifests SET last_used = ? WHERE id = ?", (time.time_ns(), manifest_id))
+
+        rows = self.db.execute(
+            "SELECT algorithm, digest, name, line FROM entries WHERE manifest = ? AND basename = ? ORDER BY line",
+            (manifest_id, os.path.basename(filepath))
+        ).fetchall()
+        entries = [hash_manifest.ManifestEntry(algorithm, digest.hex(), name, line)
+                   for algorithm, digest, name, line in rows]
+        return best_entries(entries, manifest, filepath)
+
+    def evict(self):
+        """Drop the least recently used manifests beyond ``max_manifests``."""
+        stale = self.db.execute(
+            "SELECT id FROM manifests ORDER BY last_used DESC LIMIT -1 OFFSET ?", (self.max_manifests,)
+        ).fetchall()
+        if stale:
+            with self.db:
+                self.db.executemany("DELETE FROM entries WHERE manifest = ?", stale)
+                self.db.executemany("DELETE FROM manifests WHERE id = ?", stale)
+
+
+def open_index(path=None):
+    """
+    Open the manifest index, or return None if it is unavailable.
+
+    :param path: Database file (default: default_index_path())
+    :return: ManifestIndex or None
+    """
+    try:
+        return ManifestIndex(path)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def find_entries(manifest, filepath):
+    """
+    Find the entries for a file in a checksum manifest by its base name.
+
+    Large manifests go through the persistent index; small ones, or any
+    manifest when the index is unavailable, are scanned directly.
+
+    :param manifest: Path of the manifest
+    :param filepath: File being verified
+    :return: List of ManifestEntry, one per algorithm listed for the file
+    """
+    if os.path.getsize(manifest) >= INDEX_MIN_SIZE:
+        index = open_index()
+        if index is not None:
+            with index:
+                try:
+                    return index.lookup(manifest, filepath)
+                except (sqlite3.Error, ValueError):
+                    pass  # A broken or locked index behaves like a missing one
+    return scan_entries(manifest, filepath)
@@ -0,0 +1,168 @@
+"""
+Single-instance support for the Hash Verifier GUI.
+
+The context menu starts one process per selected file. The first process
+claims a per-user local endpoint (a named pipe on Windows, a Unix domain
+socket elsewhere) and keeps listening on it; every later launch forwards
+its file to that process and exits straight away, so a multi-select opens
+one window and one set of disk readers instead of hundreds.
+
+Only JSON is exchanged, never pickles, and the endpoint is private to the
+current user.
+"""
+import os
+import sys
+import json
+import time
+import getpass
+import tempfile
+import threading
+from multiprocessing.connection import Listener, Client
+
+# Constants
+BACKLOG = 64  # Launches that may wait to be accepted at once
+CONNECT_TIMEOUT = 5.0  # Seconds a launch keeps trying to reach the first instance
+CONNECT_RETRY = 0.05  # Seconds between attempts
+MAX_MESSAGE = 1024 * 1024  # Largest accepted request in bytes
+
+
+def runtime_dir():
+    """
+    Directory for the current user's sockets, unreachable by other users (POSIX only).
+
+    :return: Directory path, or None if no private location exists
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if not base:
+        base = os.path.join(tempfile.gettempdir(), f"hash-verifier-{os.getuid()}")
+        try:
+            os.makedirs(base, mode=0o700, exist_ok=True)
+            st = os.stat(base)
+        except OSError:
+            return None
+        # Someone else could have created the directory first
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            return None
+    return base
+
+
+def address():
+    """
+    Endpoint of the running instance for the current user.
+
+    :return: Pipe name or socket path, or None if no private location exists
+    """
+    if sys.platform == "win32":
+        return rf"\\.\pipe\HashVerifier-{getpass.getuser()}"
+
+    base = runtime_dir()
+    return os.path.join(base, "hash-verifier.sock") if base else None
+
+
+def _family():
+    return "AF_PIPE" if sys.platform == "win32" else "AF_UNIX"
+
+
+class InstanceServer:
+    """
+    Endpoint of the first instance, receiving files from later launches.
+
+    Every request is a list of ``{"path", "expected", "follow"}`` objects
+    and is passed to the callback on the listening thread.
+    """
+
+    def __init__(self, listener, lock=None):
+        self.listener = listener
+        self.lock = lock
+        self.thread = None
+
+    def start(self, callback):
+        """
+        Start accepting requests in a daemon thread.
+
+        :param callback: Callable receiving the list of requests of one launch
+        """
+        self.thread = threading.Thread(target=self._serve, args=(callback,), daemon=True)
+        self.thread.start()
+
+    def _serve(self, callback):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                return  # Listener closed
+            try:
+                with connection:
+                    requests = json.loads(connection.recv_bytes(MAX_MESSAGE))
+                    connection.send_bytes(b"ok")
+            except (OSError, EOFError, ValueError):
+                continue  # A launch that died half-way or sent garbage
+            if isinstance(requests, list):
+                callback([r for r in requests if isinstance(r, dict) and isinstance(r.get("path"), str)])
+
+    def close(self):
+        """Stop listening and release the endpoint."""
+        self.listener.close()
+        if self.lock is not None:
+            self.lock.close()
+
+
+def claim():
+    """
+    Become the first instance if no other one is running.
+
+    :return: InstanceServer, or None if another instance owns the endpoint
+             or single-instance mode is unavailable
+    """
+    endpoint = address()
+    if endpoint is None:
+        return None
+
+    if sys.platform == "win32":
+        try:
+            return InstanceServer(Listener(endpoint, _family(), BACKLOG))  # Fails if the pipe exists
+        except OSError:
+            return None
+
+    # A lock decides the owner; it is released by the kernel when the owner
+    # exits, so a socket file left behind by a crash can be removed safely
+    import fcntl
+    try:
+        lock = open(endpoint + ".lock", "a")
+    except OSError:
+        return None
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if os.path.exists(endpoint):
+            os.remove(endpoint)
+        return InstanceServer(Listener(endpoint, _family(), BACKLOG), lock)
+    except OSError:
+        lock.close()
+        return None
+
+
+def forward(requests, timeout=CONNECT_TIMEOUT):
+    """
+    Hand files over to the running instance.
+
+    The first instance may still be starting up, so connecting is retried
+    until ``timeout`` expires.
+
+    :param requests: List of ``{"path", "expected", "follow"}`` dictionaries
+    :param timeout: Seconds to keep trying
+    :return: True if the running instance accepted the files
+    """
+    endpoint = address()
+    if endpoint is None:
+        return False
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with Client(endpoint, _family()) as connection:
+                connection.send_bytes(json.dumps(requests).encode("utf-8"))
+                return connection.recv_bytes(16) == b"ok"
+        except (OSError, EOFError):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(CONNECT_RETRY)
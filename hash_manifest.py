@@ -0,0 +1,195 @@
+"""
+Checksum manifest parsing and verification for Hash Verifier.
+
+Understands the GNU coreutils layout (``<digest>  <name>``, including the
+backslash escaping used for unusual names) and the tagged BSD layout
+(``SHA256 (<name>) = <digest>``). Manifests are parsed as a stream and the
+listed files are verified in parallel through hash_batch, computing only the
+algorithms the manifest names and reading every file once.
+"""
+import os
+import re
+import collections
+
+import hash_batch
+import hash_engine
+
+# Manifest line layouts
+BSD_LINE = re.compile(r'^\\?([A-Za-z0-9-]+) \((.*)\) = ([0-9a-fA-F]+)$')
+GNU_LINE = re.compile(r'^\\?([0-9a-fA-F]+) [ *](.*)$')
+
+# Verification outcomes
+OK = "OK"
+FAILED = "FAILED"
+MISSING = "MISSING"
+UNREADABLE = "UNREADABLE"
+
+ManifestEntry = collections.namedtuple("ManifestEntry", "algorithm digest name line")
+CheckResult = collections.namedtuple("CheckResult", "name path status algorithms error")
+
+
+def algorithm_from_tag(tag):
+    """
+    Map a BSD tag such as "SHA256" to an algorithm name.
+
+    :param tag: Tag from a BSD-style line
+    :return: Algorithm name, or None if unsupported
+    """
+    for algorithm, known in hash_engine.SUM_TAGS.items():
+        if known.upper() == tag.upper():
+            return algorithm
+    try:
+        return hash_engine.resolve_algorithm(tag)
+    except ValueError:
+        return None
+
+
+def algorithm_from_filename(path):
+    """
+    Guess the algorithm of a GNU-style manifest from its file name.
+
+    Recognises names such as SHA256SUMS, MD5SUMS and release.iso.sha256.
+
+    :param path: Path of the manifest
+    :return: Algorithm name, or None if the name says nothing
+    """
+    name = os.path.basename(path)
+    ext = os.path.splitext(name)[1]
+    candidates = [name[:-4]] if name.upper().endswith("SUMS") else []
+    candidates.append(ext.lstrip("."))
+    for candidate in candidates:
+        algorithm = algorithm_from_tag(candidate) if candidate else None
+        if algorithm:
+            return algorithm
+    return None
+
+
+def _unescape(name):
+    return re.sub(r'\\(.)', lambda m: "\n" if m.group(1) == "n" else m.group(1), name)
+
+
+def parse_line(line, default_algorithm=None):
+    """
+    Parse one manifest line.
+
+    :param line: Line without the trailing newline
+    :param default_algorithm: Algorithm for GNU-style lines, None to go by length
+    :return: Tuple of (algorithm, digest, name), or None if the line is not a checksum
+             or its digest does not have the algorithm's length
+    """
+    escaped = line.startswith("\\")
+
+    match = BSD_LINE.match(line)
+    if match:
+        tag, name, digest = match.groups()
+        algorithm = algorithm_from_tag(tag)
+    else:
+        match = GNU_LINE.match(line)
+        if not match:
+            return None
+        digest, name = match.groups()
+        algorithm = default_algorithm
+        if algorithm is None:
+            candidates = hash_engine.algorithms_for_hash(digest)
+            algorithm = candidates[0] if candidates else None
+
+    # A digest of the wrong length is a malformed line, as for sha256sum -c
+    if algorithm is None or algorithm not in hash_engine.HASH_LENGTHS.get(len(digest), ()):
+        return None
+    return algorithm, digest.lower(), _unescape(name) if escaped else name
+
+
+def iter_entries(path, errors=None):
+    """
+    Stream the entries of a manifest file.
+
+    Blank lines and ``#`` comments are skipped.
+
+    :param path: Path of the manifest
+    :param errors: Optional list that receives the numbers of unparsable lines
+    """
+    default_algorithm = algorithm_from_filename(path)
+    with open(path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+        for number, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            parsed = parse_line(line, default_algorithm)
+            if parsed is None:
+                if errors is not None:
+                    errors.append(number)
+                continue
+            yield ManifestEntry(*parsed, number)
+
+
+def iter_groups(entries):
+    """
+    Merge consecutive entries for the same file.
+
+    BSD manifests often list several algorithms for one file in a row;
+    merging them means the file is read only once.
+
+    :param entries: Iterable of ManifestEntry
+    :return: Iterator of (name, {algorithm: digest}) tuples
+    """
+    name = None
+    expected = {}
+    for entry in entries:
+        if entry.name != name and expected:
+            yield name, expected
+            expected = {}
+        name = entry.name
+        expected[entry.algorithm] = entry.digest
+    if expected:
+        yield name, expected
+
+
+def _stored_as(filepath):
+    """A compressed copy of a listed file that is missing, or the path unchanged."""
+    if os.path.lexists(filepath):
+        return filepath
+    for suffix in hash_engine.COMPRESSED_SUFFIXES:
+        if os.path.lexists(filepath + suffix):
+            return filepath + suffix
+    return filepath
+
+
+def verify_manifest(path, base_dir=None, errors=None, **kwargs):
+    """
+    Verify every file listed in a manifest.
+
+    Results are yielded in manifest order as soon as they are known. With
+    ``decompress``, a listed file that only exists compressed (name.gz,
+    name.xz or name.bz2) is verified through its decompressed payload;
+    files that exist under their listed name are verified as stored.
+
+    :param path: Path of the manifest
+    :param base_dir: Directory names are relative to (default: the manifest's)
+    :param errors: Optional list that receives the numbers of unparsable lines
+    :param kwargs: Passed on to hash_batch.hash_jobs
+    :return: Iterator of CheckResult
+    """
+    if base_dir is None:
+        base_dir = os.path.dirname(os.path.abspath(path))
+    decompress = kwargs.pop("decompress", False)
+    expectations = collections.deque()
+
+    def jobs():
+        for name, expected in iter_groups(iter_entries(path, errors)):
+            filepath = listed = os.path.join(base_dir, name)
+            if decompress:
+                filepath = _stored_as(listed)
+            expectations.append((name, expected))
+            yield filepath, list(expected), filepath != listed
+
+    for filepath, hashes, error in hash_batch.hash_jobs(jobs(), **kwargs):
+        name, expected = expectations.popleft()
+        algorithms = tuple(expected)
+
+        if error:
+            status = MISSING if not os.path.lexists(filepath) else UNREADABLE
+            yield CheckResult(name, filepath, status, algorithms, error)
+        elif all(hashes[algo] == digest for algo, digest in expected.items()):
+            yield CheckResult(name, filepath, OK, algorithms, None)
+        else:
+            yield CheckResult(name, filepath, FAILED, algorithms, None)
@@ -0,0 +1,146 @@
+"""
+Timing instrumentation for Hash Verifier.
+
+A HashProfile passed to hash_engine.hash_file records where the time of
+one file went, using ``time.perf_counter_ns``:
+
+* read wait: time spent inside read calls, i.e. waiting for the disk
+* queue stalls: time the reader was blocked because a digest worker was
+  still busy with earlier chunks
+* digest time: time each algorithm spent hashing, and the time its worker
+  sat idle waiting for data
+
+Without a profile the engine makes no timing calls at all. Profiles cross
+process boundaries as plain dictionaries (``as_dict``), which can be
+summed with ``total`` and written out as JSON.
+"""
+import json
+
+NS_PER_MS = 1000000
+
+
+def _ms(ns):
+    return round(ns / NS_PER_MS, 3)
+
+
+def _mb_per_s(nbytes, ns):
+    return round(nbytes / (ns / 1e9) / (1024 * 1024), 2) if ns and nbytes else None
+
+
+class HashProfile:
+    """Timings of one hash_file call, in nanoseconds."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.wall_ns = 0
+        self.read_ns = 0
+        self.reads = 0
+        self.read_bytes = 0
+        self.stall_ns = 0
+        self.digest_ns = {}  # Algorithm -> time spent hashing
+        self.idle_ns = {}  # Algorithm -> time its worker waited for data
+
+    def as_dict(self):
+        """
+        JSON-friendly summary.
+
+        :return: Dictionary of milliseconds and MB/s figures
+        """
+        digests = {
+            algo: {
+                "cpu_ms": _ms(ns),
+                "idle_ms": _ms(self.idle_ns.get(algo, 0)),
+                "mb_per_s": _mb_per_s(self.bytes, ns),
+            }
+            for algo, ns in self.digest_ns.items()
+        }
+        return {
+            "bytes": self.bytes,
+            "wall_ms": _ms(self.wall_ns),
+            "mb_per_s": _mb_per_s(self.bytes, self.wall_ns),
+            "reads": self.reads,
+            "read_bytes": self.read_bytes,
+            "read_wait_ms": _ms(self.read_ns),
+            "read_mb_per_s": _mb_per_s(self.read_bytes, self.read_ns),
+            "queue_stall_ms": _ms(self.stall_ns),
+            "digests": digests,
+            "bottleneck": bottleneck(self.read_ns, self.digest_ns),
+        }
+
+
+def bottleneck(read_ns, digest_ns):
+    """
+    Name the stage that took longest.
+
+    :param read_ns: Time spent reading
+    :param digest_ns: Dictionary mapping algorithm name to hashing time
+    :return: "read", an algorithm name, or None if nothing was measured
+    """
+    stages = {"read": read_ns, **digest_ns}
+    slowest = max(stages, key=stages.get)
+    return slowest if stages[slowest] else None
+
+
+def total(profiles):
+    """
+    Sum the summaries of several files.
+
+    Wall time is summed as well, so for files hashed in parallel it is the
+    busy time of all workers, not the elapsed time.
+
+    :param profiles: Iterable of dictionaries from HashProfile.as_dict
+    :return: Dictionary in the same format
+    """
+    result = HashProfile()
+    files = 0
+    for profile in profiles:
+        files += 1
+        result.bytes += profile["bytes"]
+        result.wall_ns += profile["wall_ms"] * NS_PER_MS
+        result.read_ns += profile["read_wait_ms"] * NS_PER_MS
+        result.reads += profile["reads"]
+        result.read_bytes += profile["read_bytes"]
+        result.stall_ns += profile["queue_stall_ms"] * NS_PER_MS
+        for algo, digest in profile["digests"].items():
+            result.digest_ns[algo] = result.digest_ns.get(algo, 0) + digest["cpu_ms"] * NS_PER_MS
+            result.idle_ns[algo] = result.idle_ns.get(algo, 0) + digest["idle_ms"] * NS_PER_MS
+    return {"files": files, **result.as_dict()}
+
+
+def describe(profile):
+    """
+    Human-readable lines for a summary.
+
+    :param profile: Dictionary from HashProfile.as_dict or total
+    :return: List of strings
+    """
+    def rate(value):
+        return f"{value:.1f} MB/s" if value else "n/a"
+
+    lines = [
+        f"Total: {profile['wall_ms']:.1f} ms, {rate(profile['mb_per_s'])}",
+        f"Read wait: {profile['read_wait_ms']:.1f} ms in {profile['reads']} reads, {rate(profile['read_mb_per_s'])}",
+        f"Queue stalls: {profile['queue_stall_ms']:.1f} ms",
+    ]
+    for algo, digest in profile["digests"].items():
+        lines.append(f"{algo}: {digest['cpu_ms']:.1f} ms hashing, {digest['idle_ms']:.1f} ms idle, "
+                     f"{rate(digest['mb_per_s'])}")
+    if profile["bottleneck"]:
+        lines.append(f"Bottleneck: {profile['bottleneck']}")
+    return lines
+
+
+def write_report(path, files):
+    """
+    Write a JSON report of per-file profiles and their total.
+
+    :param path: Output file
+    :param files: List of (filepath, dictionary from HashProfile.as_dict)
+    """
+    report = {
+        "files": [{"path": filepath, **profile} for filepath, profile in files],
+        "total": total(profile for _, profile in files),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
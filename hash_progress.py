@@ -0,0 +1,194 @@
+"""
+Progress reporting for Hash Verifier.
+
+The hashing thread only stores its byte count in a shared Progress object,
+which costs two attribute assignments per chunk. Front ends poll that object
+at a fixed rate instead of receiving an event per chunk, so the GUI event loop
+and the terminal are never flooded no matter how fast the file is read.
+"""
+import sys
+import time
+import threading
+
+# Constants
+POLL_INTERVAL = 0.05  # Seconds between polls (20 Hz)
+RATE_SMOOTHING = 0.3  # Weight of the newest sample in the throughput average
+
+
+def format_size(size):
+    """
+    Format a byte count for display.
+
+    :param size: Number of bytes
+    :return: e.g. "1.50 GB"
+    """
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size < 1024.0:
+            return f"{size:.2f} {unit}"
+        size /= 1024.0
+    return f"{size:.2f} PB"
+
+
+def format_duration(seconds):
+    """
+    Format a duration as [h:]mm:ss.
+
+    :param seconds: Duration in seconds
+    :return: Formatted duration
+    """
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class Progress:
+    """
+    Shared progress counter.
+
+    Writers call ``update`` or ``advance`` from any thread; readers call
+    ``sample`` at their own pace to get the position, throughput and ETA.
+    """
+
+    def __init__(self, total=0):
+        """
+        :param total: Expected number of bytes, 0 if unknown
+        """
+        self.total = total
+        self.done = 0
+        self.files = 0
+        self._last_time = time.perf_counter()
+        self._last_done = 0
+        self._rate = None
+
+    def update(self, done, total=None):
+        """
+        Set the absolute position. Matches the hash_file progress callback.
+
+        :param done: Bytes processed so far
+        :param total: Expected number of bytes, if it changed
+        """
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def advance(self, nbytes, files=1):
+        """
+        Add to the position, e.g. once per finished file.
+
+        :param nbytes: Bytes processed
+        :param files: Files completed
+        """
+        self.done += nbytes
+        self.files += files
+
+    @property
+    def fraction(self):
+        """Completed fraction between 0 and 1, or None if the total is unknown."""
+        return min(self.done / self.total, 1.0) if self.total else None
+
+    def sample(self):
+        """
+        Read the current state. Must be called from a single thread.
+
+        :return: Tuple of (done, total, fraction, bytes_per_second, eta_seconds);
+                 fraction and eta are None while the total is unknown
+        """
+        now = time.perf_counter()
+        done = self.done
+        total = self.total
+
+        elapsed = now - self._last_time
+        # Very short intervals give noisy rates, keep the previous estimate
+        if elapsed >= POLL_INTERVAL / 2:
+            rate = (done - self._last_done) / elapsed
+            self._rate = rate if self._rate is None else (
+                RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self._rate
+            )
+            self._last_time = now
+            self._last_done = done
+
+        rate = self._rate or 0.0
+        fraction = min(done / total, 1.0) if total else None
+        eta = (total - done) / rate if total and rate > 0 else None
+        return done, total, fraction, rate, eta
+
+    def describe(self):
+        """
+        One line summary for labels and terminals.
+
+        :return: e.g. "45% - 120.50 MB/s - 00:12 left"
+        """
+        done, total, fraction, rate, eta = self.sample()
+        parts = [f"{fraction * 100:.0f}%" if fraction is not None else format_size(done)]
+        if self.files:
+            parts.append(f"{self.files} files")
+        parts.append(f"{format_size(rate)}/s")
+        if eta is not None:
+            parts.append(f"{format_duration(eta)} left")
+        return " - ".join(parts)
+
+
+class ProgressPrinter(threading.Thread):
+    """
+    Redraw a progress line on a terminal at a fixed rate.
+
+    Nothing is printed when the stream is not a terminal, so redirected
+    output stays machine readable.
+    """
+
+    def __init__(self, progress, stream=None, interval=0.5):
+        """
+        :param progress: Progress object to display
+        :param stream: Output stream (default: sys.stderr)
+        :param interval: Seconds between redraws
+        """
+        super().__init__(name="progress", daemon=True)
+        self.progress = progress
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.enabled = self.stream.isatty()
+        self._halt = threading.Event()
+        self._lock = threading.Lock()
+        self._width = 0
+
+    def __enter__(self):
+        if self.enabled:
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            with self._lock:
+                self._draw(self.progress.describe())
+
+    def _draw(self, text):
+        self.stream.write("\r" + text.ljust(self._width))
+        if not text:
+            self.stream.write("\r")
+        self.stream.flush()
+        self._width = len(text)
+
+    def print(self, text, file=None):
+        """
+        Print a line without mixing it into the progress line.
+
+        :param text: Line to print
+        :param file: Output stream (default: sys.stdout)
+        """
+        with self._lock:
+            if self.enabled and self._width:
+                self._draw("")
+            print(text, file=file or sys.stdout, flush=True)
+
+    def stop(self):
+        """Stop redrawing and clear the progress line."""
+        if not self.enabled or self._halt.is_set():
+            return
+        self._halt.set()
+        self.join()
+        self._draw("")
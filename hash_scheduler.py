@@ -0,0 +1,171 @@
+"""
+Device-aware scheduling of multi-file jobs for Hash Verifier.
+
+A spinning disk or a network share slows to a crawl when many processes
+read different files from it at once, while an SSD is happy to serve
+several readers. Pending files are therefore grouped by the device they
+live on, each device gets its own limit of concurrent readers, and files
+are handed out in inode order within a device, which roughly follows
+their layout on disk. Files on different devices are still hashed in
+parallel, so CPU-heavy algorithms keep every worker busy.
+
+The kind of device is detected from sysfs and /proc/self/mountinfo on
+Linux. Elsewhere every device is "unknown" and only limited by the number
+of workers, as before.
+"""
+import os
+import sys
+import heapq
+import functools
+import collections
+
+# Device kinds
+SSD = "ssd"
+HDD = "hdd"
+NETWORK = "network"
+MEMORY = "memory"
+UNKNOWN = "unknown"
+
+# Concurrent readers per device of each kind, None for no limit
+DEFAULT_READERS = {SSD: 8, HDD: 1, NETWORK: 2, MEMORY: None, UNKNOWN: None}
+
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs",
+                       "fuse.sshfs", "fuse.rclone", "davfs", "fuse.glusterfs"}
+MEMORY_FILESYSTEMS = {"tmpfs", "ramfs", "devtmpfs"}
+
+
+def _mounts():
+    """Map "major:minor" to (file system type, source) from /proc/self/mountinfo."""
+    mounts = {}
+    try:
+        with open("/proc/self/mountinfo", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields, _, rest = line.partition(" - ")
+                fields, rest = fields.split(), rest.split()
+                if len(fields) >= 3 and len(rest) >= 2:
+                    mounts.setdefault(fields[2], (rest[0], rest[1]))
+    except OSError:
+        pass
+    return mounts
+
+
+def _rotational(major, minor):
+    """Read queue/rotational of a block device or of the disk holding a partition."""
+    try:
+        path = os.path.realpath(f"/sys/dev/block/{major}:{minor}")
+    except OSError:
+        return None
+    for directory in (path, os.path.dirname(path)):
+        try:
+            with open(os.path.join(directory, "queue", "rotational")) as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def device_kind(dev):
+    """
+    Classify the device a file lives on.
+
+    :param dev: ``st_dev`` of the file
+    :return: One of SSD, HDD, NETWORK, MEMORY or UNKNOWN
+    """
+    if not sys.platform.startswith("linux"):
+        return UNKNOWN
+
+    major, minor = os.major(dev), os.minor(dev)
+    fstype, source = _mounts().get(f"{major}:{minor}", (None, None))
+    if fstype in NETWORK_FILESYSTEMS:
+        return NETWORK
+    if fstype in MEMORY_FILESYSTEMS:
+        return MEMORY
+
+    # Btrfs, overlayfs and friends report an anonymous device number;
+    # the mount source still names the block device behind them
+    if major == 0 and source and source.startswith("/dev/"):
+        try:
+            rdev = os.stat(source).st_rdev
+        except OSError:
+            return UNKNOWN
+        major, minor = os.major(rdev), os.minor(rdev)
+
+    rotational = _rotational(major, minor)
+    if rotational is None:
+        return UNKNOWN
+    return HDD if rotational else SSD
+
+
+class DeviceScheduler:
+    """
+    Pending files grouped by device, handed out as batches.
+
+    Every batch holds files of one device in inode order. A device with
+    ``limit`` batches out is skipped until one of them is ``done``.
+    """
+
+    def __init__(self, readers=None):
+        """
+        :param readers: Dictionary overriding DEFAULT_READERS per device kind
+        """
+        self.readers = {**DEFAULT_READERS, **(readers or {})}
+        self.queues = collections.defaultdict(list)  # st_dev -> heap of (st_ino, seq, size, item)
+        self.active = collections.Counter()  # st_dev -> batches out
+        self.pending = 0
+
+    def __len__(self):
+        return self.pending
+
+    def limit(self, dev):
+        """Concurrent batches allowed for a device, None for no limit."""
+        return self.readers[device_kind(dev)]
+
+    def add(self, st, seq, item):
+        """
+        Queue a file.
+
+        :param st: os.stat_result of the file
+        :param seq: Input position, breaks ties and keeps the order stable
+        :param item: Anything, returned by next_batch
+        """
+        heapq.heappush(self.queues[st.st_dev], (st.st_ino, seq, st.st_size, item))
+        self.pending += 1
+
+    def next_batch(self, batch_bytes, batch_files):
+        """
+        Take the next batch from the least busy device that has room.
+
+        Among equally busy devices the one holding the oldest file wins, so
+        results do not pile up waiting for it.
+
+        :param batch_bytes: Stop adding files once the batch holds this much data
+        :param batch_files: Maximum number of files per batch
+        :return: Tuple of (st_dev, list of (seq, item)), or None if every
+                 device with pending files is at its limit
+        """
+        ready = [
+            dev for dev, queue in self.queues.items()
+            if queue and (self.limit(dev) is None or self.active[dev] < self.limit(dev))
+        ]
+        if not ready:
+            return None
+        dev = min(ready, key=lambda d: (self.active[d], min(entry[1] for entry in self.queues[d])))
+
+        queue = self.queues[dev]
+        batch = []
+        total = 0
+        while queue and total < batch_bytes and len(batch) < batch_files:
+            _, seq, size, item = heapq.heappop(queue)
+            batch.append((seq, item))
+            total += size
+        if not queue:
+            del self.queues[dev]
+
+        self.pending -= len(batch)
+        self.active[dev] += 1
+        return dev, batch
+
+    def done(self, dev):
+        """Mark a batch handed out for a device as finished."""
+        self.active[dev] -= 1
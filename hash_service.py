@@ -0,0 +1,410 @@
+"""
+Local hashing service for Hash Verifier.
+
+Lets other tools hand files to the hashing engine without starting a new
+process each time. The service speaks newline-delimited JSON over a Unix
+domain socket in the user's private runtime directory or, where that is
+not available or a port is asked for, over a TCP port on 127.0.0.1. Each
+request line is one object with an ``op`` and an optional ``id`` that is
+echoed in every event sent back for it:
+
+    {"id": 1, "op": "hash", "path": "/data/a.iso", "algorithms": ["SHA-256"]}
+    {"id": 2, "op": "verify", "path": "/data/a.iso", "expected": "e3b0..."}
+    {"id": 3, "op": "metrics"}
+
+Any local user can connect to a TCP port, so there every request must also
+carry the ``token`` that ``serve`` writes to a file only the owner can read
+(see default_token_path).
+
+Jobs go through a bounded queue and are run on a thread or process pool.
+A job for a file and algorithm set that is already queued or running is
+attached to the existing one instead of reading the file again. Clients
+receive ``queued``, ``progress`` (thread pool only) and finally ``result``
+or ``error`` events.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import asyncio
+import secrets
+import functools
+import collections
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import hash_cache
+import hash_engine
+import hash_instance
+import hash_tuner
+from hash_progress import POLL_INTERVAL, Progress
+
+# Constants
+DEFAULT_PORT = 8765
+QUEUE_LIMIT = 256  # Jobs waiting before new ones are refused
+TIMING_HISTORY = 100  # Finished jobs kept for the metrics
+MAX_LINE = 64 * 1024  # Longest accepted request line
+
+
+def default_socket_path():
+    """
+    Private Unix socket the service listens on by default.
+
+    :return: Socket path, or None where Unix sockets or a private directory are unavailable
+    """
+    if sys.platform == "win32" or not hasattr(asyncio, "start_unix_server"):
+        return None
+    base = hash_instance.runtime_dir()
+    return os.path.join(base, "hash-service.sock") if base else None
+
+
+def default_token_path():
+    """
+    Location of the token file, next to the digest cache.
+
+    :return: Path of the token file
+    """
+    return os.path.join(os.path.dirname(hash_cache.default_cache_path()), "service.token")
+
+
+def write_token(path=None):
+    """
+    Generate a new token and store it where only the current user can read it.
+
+    :param path: Token file (default: default_token_path())
+    :return: The token
+    """
+    path = path or default_token_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    try:
+        os.remove(path)  # Recreate rather than trust the permissions of an old file
+    except FileNotFoundError:
+        pass
+    token = secrets.token_hex(16)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+        f.write(token + "\n")
+    return token
+
+
+def run_job(filepath, algorithms, backend=None, block_size=None, use_cache=True, progress=None):
+    """
+    Hash one file for the service. Runs in a pool thread or process.
+
+    :return: Dictionary mapping algorithm name to hex digest
+    """
+    backend, buffer_size = hash_tuner.read_plan(filepath, backend, block_size)
+    options = {"progress": progress, "backend": backend, "buffer_size": buffer_size}
+    cache = hash_cache.open_cache() if use_cache else None  # One connection per call and thread
+    if cache is None:
+        return hash_engine.hash_file(filepath, algorithms, **options)
+    with cache:
+        return cache.hash_file(filepath, algorithms, **options)
+
+
+class Job:
+    """One file and algorithm set, shared by every request asking for it."""
+
+    def __init__(self, filepath, algorithms):
+        self.filepath = filepath
+        self.algorithms = algorithms
+        self.progress = Progress()
+        self.future = asyncio.get_running_loop().create_future()
+        # Every client may have gone away; do not warn about an unread error
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.queued = time.perf_counter()
+        self.started = None
+
+
+class HashService:
+    """
+    Bounded job queue in front of a worker pool.
+
+    ``workers`` asyncio tasks take jobs from the queue, so at most that many
+    files are read at once no matter how many clients are connected.
+    """
+
+    def __init__(self, workers=None, processes=False, queue_limit=QUEUE_LIMIT, backend=None,
+                 block_size=None, use_cache=True):
+        """
+        :param workers: Jobs run at once (default: CPU count)
+        :param processes: Use a process pool instead of threads (no progress events)
+        :param queue_limit: Jobs waiting before new ones are refused
+        :param backend: Read backend passed to hash_engine.hash_file
+        :param block_size: Read block size, or None to use hash_tuner
+        :param use_cache: Consult and update the digest cache
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.options = {"backend": backend, "block_size": block_size, "use_cache": use_cache}
+        self.queue = asyncio.Queue(queue_limit)
+        self.pool = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(self.workers)
+        self.active = {}  # (path, algorithms) -> Job, while queued or running
+        self.running = 0
+        self.counters = collections.Counter()
+        self.timings = collections.deque(maxlen=TIMING_HISTORY)
+        self.tasks = []
+
+    def start(self):
+        """Start the worker tasks on the running loop."""
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, filepath, algorithms):
+        """
+        Queue a job, or join the identical one already queued or running.
+
+        :return: Tuple of (Job, deduplicated)
+        :raise asyncio.QueueFull: If the queue is full
+        """
+        key = (filepath, tuple(algorithms))
+        job = self.active.get(key)
+        if job is not None:
+            self.counters["deduplicated"] += 1
+            return job, True
+
+        job = Job(filepath, list(algorithms))
+        self.queue.put_nowait(job)
+        self.active[key] = job
+        self.counters["submitted"] += 1
+        return job, False
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            job.started = time.perf_counter()
+            self.running += 1
+            try:
+                if self.processes:
+                    # Progress callbacks cannot cross the process boundary
+                    call = functools.partial(run_job, job.filepath, job.algorithms, **self.options)
+                else:
+                    call = functools.partial(run_job, job.filepath, job.algorithms,
+                        progress=job.progress.update, **self.options)
+                hashes = await loop.run_in_executor(self.pool, call)
+                job.future.set_result(hashes)
+                self.counters["completed"] += 1
+            except Exception as e:
+                job.future.set_exception(e)
+                self.counters["failed"] += 1
+            finally:
+                self.running -= 1
+                self.active.pop((job.filepath, tuple(job.algorithms)), None)
+                self._record(job)
+                self.queue.task_done()
+
+    def _record(self, job):
+        seconds = time.perf_counter() - job.started
+        size = job.progress.total
+        if not size:
+            try:
+                size = os.path.getsize(job.filepath)
+            except OSError:
+                size = 0
+        self.timings.append({
+            "path": job.filepath,
+            "wait_seconds": round(job.started - job.queued, 6),
+            "run_seconds": round(seconds, 6),
+            "bytes": size,
+            "mb_per_s": round(size / seconds / (1024 * 1024), 2) if seconds and size else None,
+        })
+
+    def metrics(self):
+        """
+        Snapshot of the service state.
+
+        :return: Dictionary of queue depth, concurrency, counters and recent job timings
+        """
+        runs = [t["run_seconds"] for t in self.timings]
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_limit": self.queue.maxsize,
+            "running": self.running,
+            "workers": self.workers,
+            "pool": "process" if self.processes else "thread",
+            "counters": dict(self.counters),
+            "avg_run_seconds": round(sum(runs) / len(runs), 6) if runs else None,
+            "recent_jobs": list(self.timings),
+        }
+
+
+def _event(request_id, event, **fields):
+    return (json.dumps({"id": request_id, "event": event, **fields}) + "\n").encode("utf-8")
+
+
+class Connection:
+    """One client connection; requests on it are handled concurrently."""
+
+    def __init__(self, service, reader, writer, token=None):
+        self.service = service
+        self.token = token.encode("utf-8") if token else None
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.tasks = set()
+
+    async def send(self, data):
+        async with self.lock:
+            self.writer.write(data)
+            await self.writer.drain()
+
+    async def serve(self):
+        try:
+            while True:
+                try:
+                    line = await self.reader.readline()
+                except ValueError:  # Line longer than MAX_LINE
+                    await self.send(_event(None, "error", error="request too long"))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    await self.send(_event(None, "error", error=f"invalid request: {e}"))
+                    continue
+                task = asyncio.create_task(self.handle(request))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            self.writer.close()
+
+    async def handle(self, request):
+        request_id = request.get("id")
+        op = request.get("op")
+        if self.token and not hmac.compare_digest(str(request.get("token", "")).encode("utf-8"), self.token):
+            await self.send(_event(request_id, "error", error="invalid token"))
+            return
+        try:
+            if op == "metrics":
+                await self.send(_event(request_id, "metrics", **self.service.metrics()))
+            elif op in ("hash", "verify"):
+                await self.run(request_id, op, request)
+            else:
+                await self.send(_event(request_id, "error", error=f"unknown op: {op}"))
+        except ConnectionError:
+            pass
+
+    async def run(self, request_id, op, request):
+        path = request.get("path")
+        if not isinstance(path, str):
+            await self.send(_event(request_id, "error", error="path is required"))
+            return
+
+        expected = None
+        try:
+            if op == "verify":
+                expected = hash_engine.normalize_hash(str(request.get("expected", "")))
+                algorithms = hash_engine.preferred_algorithms(expected)
+                if not algorithms:
+                    raise ValueError(f"not a recognised hash: {expected}")
+            else:
+                names = request.get("algorithms") or list(hash_engine.DEFAULT_ALGORITHMS)
+                algorithms = [hash_engine.resolve_algorithm(name) for name in names]
+        except (ValueError, TypeError) as e:
+            await self.send(_event(request_id, "error", error=str(e)))
+            return
+
+        job = await self.wait(request_id, os.path.abspath(path), algorithms)
+        if job is None:
+            return
+        hashes = dict(job.future.result())
+        started = job.started
+
+        # Opt-in digests of the same length only if no default one matched
+        remaining = hash_engine.remaining_algorithms(expected, hashes) if expected is not None else None
+        if remaining and not hash_engine.match_hash(expected, hashes):
+            job = await self.wait(request_id, job.filepath, remaining)
+            if job is None:
+                return
+            hashes.update(job.future.result())
+
+        result = {"path": job.filepath, "hashes": hashes,
+                  "seconds": round(time.perf_counter() - started, 6)}
+        if expected is not None:
+            result["expected"] = expected
+            result["match"] = hash_engine.match_hash(expected, hashes)
+        await self.send(_event(request_id, "result", **result))
+
+    async def wait(self, request_id, filepath, algorithms):
+        """
+        Submit a job and report on it until it is done.
+
+        :return: The finished Job, or None once an error has been sent
+        """
+        try:
+            job, deduplicated = self.service.submit(filepath, algorithms)
+        except asyncio.QueueFull:
+            await self.send(_event(request_id, "error", error="queue full, try again later"))
+            return None
+        await self.send(_event(request_id, "queued", path=job.filepath, deduplicated=deduplicated,
+            queue_depth=self.service.queue.qsize()))
+
+        # Report progress until the job is done; shield it so that a client
+        # going away does not cancel a job other clients are waiting for
+        shown = None
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(job.future), POLL_INTERVAL * 4)
+                return job
+            except Exception as e:
+                # On 3.11+ asyncio.TimeoutError is TimeoutError, which a job failing
+                # with ETIMEDOUT raises too; only an unfinished job means the poll timed out
+                if job.future.done():
+                    error = e.strerror if isinstance(e, OSError) and e.strerror else str(e)
+                    await self.send(_event(request_id, "error", path=job.filepath, error=error))
+                    return None
+            position = (job.progress.done, job.progress.total)
+            if job.started and position != shown:
+                await self.send(_event(request_id, "progress", done=position[0], total=position[1]))
+                shown = position
+
+
+async def serve(service, port=DEFAULT_PORT, socket_path=None, ready=None, token=None):
+    """
+    Run the service until cancelled.
+
+    :param service: HashService
+    :param port: TCP port on 127.0.0.1, ignored when ``socket_path`` is given
+    :param socket_path: Unix domain socket to listen on instead of TCP
+    :param ready: Optional callable receiving a description of the endpoint
+    :param token: Secret every request must carry in its ``token`` field;
+                  required for TCP, see write_token
+    """
+    if not socket_path and not token:
+        raise ValueError("a token is required to listen on a TCP port")
+
+    async def on_connect(reader, writer):
+        await Connection(service, reader, writer, token).serve()
+
+    service.start()
+    if socket_path:
+        server = await asyncio.start_unix_server(on_connect, socket_path, limit=MAX_LINE)
+        os.chmod(socket_path, 0o600)  # Local user only
+        endpoint = socket_path
+    else:
+        server = await asyncio.start_server(on_connect, "127.0.0.1", port, limit=MAX_LINE)
+        endpoint = "127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+
+    if ready:
+        ready(endpoint)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
@@ -0,0 +1,205 @@
+"""
+Chunked Merkle tree digests for Hash Verifier.
+
+A streaming digest over one huge file can only use one core. In tree mode
+the file is split into fixed-size chunks that are hashed in parallel worker
+processes and combined into a Merkle root. The per-chunk digests are saved
+next to the root, so a later verification can name the exact byte ranges
+that differ and re-read only those.
+
+Leaves are H(0x00 || chunk) and inner nodes H(0x01 || left || right), with
+an unpaired node promoted unchanged to the next level. The root therefore
+differs from the plain digest of the file.
+"""
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import hash_engine
+
+# Constants
+CHUNK_SIZE = 64 * 1024 * 1024  # Bytes per leaf
+READ_SIZE = 1024 * 1024  # Bytes per read inside a chunk
+TREE_SUFFIX = ".tree.json"
+TREE_VERSION = 1
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def hash_chunk(filepath, algorithm, offset, length):
+    """
+    Hash one chunk of a file as a Merkle leaf.
+
+    :param filepath: Path of the file
+    :param algorithm: Algorithm name
+    :param offset: Start of the chunk in bytes
+    :param length: Length of the chunk in bytes
+    :return: Raw leaf digest
+    """
+    hasher = hash_engine.ALGORITHMS[algorithm]()
+    hasher.update(LEAF_PREFIX)
+    buffer = memoryview(bytearray(min(READ_SIZE, length) or 1))
+    with open(filepath, 'rb', buffering=0) as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            n = f.readinto(buffer[:min(len(buffer), remaining)])
+            if not n:
+                raise OSError(f"File shrank while hashing: {filepath}")
+            hasher.update(buffer[:n])
+            remaining -= n
+    return hasher.digest()
+
+
+def merkle_root(leaves, algorithm):
+    """
+    Combine leaf digests into the root digest.
+
+    :param leaves: List of raw leaf digests
+    :param algorithm: Algorithm name
+    :return: Raw root digest
+    """
+    factory = hash_engine.ALGORITHMS[algorithm]
+    level = list(leaves) or [factory(LEAF_PREFIX).digest()]
+    while len(level) > 1:
+        paired = [factory(NODE_PREFIX + level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0]
+
+
+def chunk_ranges(filesize, chunk_size):
+    """
+    Split a file into chunks.
+
+    :return: List of (offset, length) tuples
+    """
+    return [(offset, min(chunk_size, filesize - offset)) for offset in range(0, filesize, chunk_size)]
+
+
+def hash_leaves(filepath, algorithm, chunk_size, indexes=None, workers=None, progress=None):
+    """
+    Hash chunks of a file across a process pool.
+
+    :param filepath: Path of the file
+    :param algorithm: Algorithm name
+    :param chunk_size: Bytes per chunk
+    :param indexes: Chunk numbers to hash (default: all)
+    :param workers: Number of worker processes (default: CPU count)
+    :param progress: Optional callable receiving (bytes_done, bytes_total)
+    :return: Dictionary mapping chunk number to raw leaf digest
+    :raise ValueError: If a chunk number is out of range
+    """
+    ranges = chunk_ranges(os.path.getsize(filepath), chunk_size)
+    if indexes is None:
+        indexes = range(len(ranges))
+    invalid = [i for i in indexes if i not in range(len(ranges))]
+    if invalid:
+        raise ValueError(f"No such chunk: {', '.join(map(str, invalid))}")
+    total = sum(ranges[i][1] for i in indexes)
+    done = 0
+    leaves = {}
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = {i: pool.submit(hash_chunk, filepath, algorithm, *ranges[i]) for i in indexes}
+        for i, future in futures.items():
+            leaves[i] = future.result()
+            done += ranges[i][1]
+            if progress:
+                progress(done, total)
+    return leaves
+
+
+def build_tree(filepath, algorithm="SHA-256", chunk_size=CHUNK_SIZE, workers=None, progress=None):
+    """
+    Compute the Merkle tree of a file.
+
+    :param filepath: Path of the file
+    :param algorithm: Algorithm name
+    :param chunk_size: Bytes per chunk
+    :param workers: Number of worker processes (default: CPU count)
+    :param progress: Optional callable receiving (bytes_done, bytes_total)
+    :return: Tree document suitable for save_tree()
+    """
+    filesize = os.path.getsize(filepath)
+    leaves = hash_leaves(filepath, algorithm, chunk_size, workers=workers, progress=progress)
+    ordered = [leaves[i] for i in range(len(leaves))]
+    return {
+        "version": TREE_VERSION,
+        "file": os.path.basename(filepath),
+        "size": filesize,
+        "algorithm": algorithm,
+        "chunk_size": chunk_size,
+        "root": merkle_root(ordered, algorithm).hex(),
+        "leaves": [leaf.hex() for leaf in ordered],
+    }
+
+
+def save_tree(tree, path):
+    """Write a tree document atomically."""
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(tree, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def load_tree(path):
+    """
+    Read a tree document.
+
+    :param path: Path of the .tree.json file
+    :return: Tree document
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = json.load(f)
+    if tree.get("version") != TREE_VERSION:
+        raise ValueError(f"Unsupported tree file version: {tree.get('version')}")
+    return tree
+
+
+def chunk_ranges_from(tree, first):
+    """Chunks of the saved tree from number ``first`` on, as (number, offset, length)."""
+    ranges = chunk_ranges(tree["size"], tree["chunk_size"])
+    return [(i, *ranges[i]) for i in range(first, len(ranges))]
+
+
+def verify_tree(filepath, tree, indexes=None, workers=None, progress=None):
+    """
+    Compare a file against a saved tree.
+
+    :param filepath: Path of the file
+    :param tree: Tree document from load_tree()
+    :param indexes: Only re-read these chunk numbers (default: all)
+    :param workers: Number of worker processes (default: CPU count)
+    :param progress: Optional callable receiving (bytes_done, bytes_total)
+    :return: Tuple of (root_matches, bad_chunks) where bad_chunks lists
+             (chunk number, offset, length) of every differing region;
+             root_matches is None when only some chunks were checked
+    """
+    filesize = os.path.getsize(filepath)
+    chunk_size = tree["chunk_size"]
+    ranges = chunk_ranges(filesize, chunk_size)
+    expected = tree["leaves"]
+
+    if filesize != tree["size"]:
+        # Chunks past the shorter end cannot match, so only hash the common part
+        common = min(len(ranges), len(expected))
+        bad = [(i, *ranges[i]) for i in range(common, len(ranges))]
+        bad += chunk_ranges_from(tree, len(ranges))
+        if indexes is None:
+            indexes = range(common)
+        indexes = [i for i in indexes if i < common]
+    else:
+        bad = []
+
+    leaves = hash_leaves(filepath, tree["algorithm"], chunk_size, indexes, workers, progress)
+    for i in sorted(leaves):
+        if i >= len(expected) or leaves[i].hex() != expected[i]:
+            bad.append((i, *ranges[i]))
+    bad.sort()
+
+    if len(leaves) != len(ranges) or filesize != tree["size"]:
+        return (False if filesize != tree["size"] else None), bad
+    ordered = [leaves[i] for i in range(len(leaves))]
+    return merkle_root(ordered, tree["algorithm"]).hex() == tree["root"], bad
@@ -0,0 +1,279 @@
+"""
+Read block size auto-tuning for Hash Verifier.
+
+NVMe drives, USB sticks and network shares each read fastest at a different
+block size. The first large file hashed from a device is probed with a few
+candidate sizes and with mmap, and the winner is remembered per file system
+so later runs can skip the probe.
+"""
+import os
+import json
+import mmap
+import stat
+import time
+import zlib
+
+import hash_cache
+import hash_engine
+
+# Constants
+CANDIDATE_SIZES = (64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024)
+DEFAULT_BLOCK_SIZE = hash_engine.BUFFER_SIZE
+PROBE_BYTES = 16 * 1024 * 1024  # Read per candidate
+TUNE_MIN_SIZE = 1024 * 1024 * 1024  # Smaller files are not worth probing
+TIE_MARGIN = 0.05  # Prefer the smaller size unless a larger one is this much faster
+TUNE_MAX_AGE = 30 * 24 * 3600  # Seconds before a device is probed again
+
+_remembered = None  # Loaded lazily from disk
+_loaded_mtime = None  # Modification time of the file _remembered was read from
+_keys = {}  # st_dev -> key of the file system in _remembered
+
+
+def parse_block_size(value):
+    """
+    Parse a block size such as "256K" or "4M".
+
+    :param value: Size in bytes with an optional K/M suffix
+    :return: Size in bytes
+    """
+    value = value.strip().upper()
+    multiplier = 1
+    if value[-1:] in ("K", "M"):
+        multiplier = 1024 if value[-1] == "K" else 1024 * 1024
+        value = value[:-1]
+    size = int(value) * multiplier
+    if size <= 0:
+        raise ValueError("block size must be positive")
+    return size
+
+
+def tuning_path():
+    """
+    Location of the remembered block sizes, next to the digest cache.
+
+    :return: Path of the JSON file
+    """
+    return os.path.join(os.path.dirname(hash_cache.default_cache_path()), "block_sizes.json")
+
+
+def _load(refresh=False):
+    global _remembered, _loaded_mtime
+    if _remembered is not None and refresh:
+        try:
+            refresh = os.stat(tuning_path()).st_mtime_ns != _loaded_mtime
+        except OSError:
+            refresh = False
+    if _remembered is None or refresh:
+        try:
+            with open(tuning_path(), 'r', encoding='utf-8') as f:
+                _loaded_mtime = os.fstat(f.fileno()).st_mtime_ns
+                _remembered = json.load(f)
+        except (OSError, ValueError):
+            _remembered = {}
+    return _remembered
+
+
+def _save(remembered):
+    path = tuning_path()
+    expired = time.time() - TUNE_MAX_AGE
+    for key in [key for key, tuned in remembered.items() if tuned.get("probed", 0) < expired]:
+        del remembered[key]  # Also drops devices that no longer exist
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(remembered, f, indent=2)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass  # Tuning is an optimisation, never an error
+
+
+def probe(filepath, candidates=CANDIDATE_SIZES, probe_bytes=PROBE_BYTES):
+    """
+    Measure read throughput of each candidate block size and of mmap.
+
+    Each candidate reads its own region of the file so earlier probes do not
+    warm the page cache for later ones. Every byte is run through crc32 so
+    that mapped pages are actually faulted in and both read paths do the
+    same amount of work.
+
+    :param filepath: Large file on the device to probe
+    :param candidates: Block sizes to try
+    :param probe_bytes: Bytes read per candidate
+    :return: Dictionary mapping block size (or "mmap") to bytes per second
+    """
+    results = {}
+    with open(filepath, 'rb', buffering=0) as f:
+        for index, block_size in enumerate(candidates):
+            buffer = memoryview(bytearray(block_size))
+            f.seek(index * probe_bytes)
+            remaining = probe_bytes
+            start = time.perf_counter()
+            while remaining > 0:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                zlib.crc32(buffer[:n])
+                remaining -= n
+            results[block_size] = _rate(probe_bytes - remaining, start)
+
+        offset = len(candidates) * probe_bytes
+        end = min(offset + probe_bytes, os.fstat(f.fileno()).st_size)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            view = memoryview(mapping)
+            start = time.perf_counter()
+            for position in range(offset, end, DEFAULT_BLOCK_SIZE):
+                zlib.crc32(view[position:position + DEFAULT_BLOCK_SIZE])
+            results["mmap"] = _rate(max(end - offset, 0), start)
+            view.release()
+    return results
+
+
+def _rate(nbytes, start):
+    elapsed = time.perf_counter() - start
+    return nbytes / elapsed if elapsed > 0 else 0.0
+
+
+def pick_block_size(throughput):
+    """
+    Choose the smallest block size that is within TIE_MARGIN of the fastest.
+
+    :param throughput: Result of probe()
+    :return: Block size in bytes
+    """
+    sizes = {size: rate for size, rate in throughput.items() if size != "mmap"}
+    best = max(sizes.values())
+    for block_size in sorted(sizes):
+        if sizes[block_size] >= best * (1 - TIE_MARGIN):
+            return block_size
+    return DEFAULT_BLOCK_SIZE
+
+
+def read_plan(filepath, backend=None, block_size=None, probe=True):
+    """
+    Decide how to read a file.
+
+    An explicit ``block_size`` wins, then the HASH_VERIFIER_BLOCK_SIZE
+    environment variable, then the result remembered for the file's device.
+    Files of at least TUNE_MIN_SIZE on a device without a remembered result
+    are probed first, unless a block size was given. With the ``auto`` backend sparse files are always
+    read with readinto, which skips their holes, and a tuned device decides
+    between readinto and mmap for the rest; otherwise
+    hash_engine.select_backend does.
+
+    :param filepath: File about to be hashed
+    :param backend: Requested read backend (default: READ_BACKEND)
+    :param block_size: Block size in bytes, or None for automatic
+    :param probe: Probe untuned devices; False only uses what was remembered,
+                  e.g. by a ``prepare`` call in the parent of worker processes
+    :return: Tuple of (backend, block_size) for hash_engine.hash_file
+    """
+    backend = backend or hash_engine.READ_BACKEND
+    if not block_size:
+        env = os.environ.get("HASH_VERIFIER_BLOCK_SIZE")
+        if env and env.lower() != "auto":
+            try:
+                block_size = parse_block_size(env)
+            except ValueError:
+                pass
+
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return backend, block_size or DEFAULT_BLOCK_SIZE
+
+    tuned = None
+    if not block_size or backend == "auto":
+        tuned = _tuned_for(filepath, st, probe and not block_size)
+
+    if backend == "auto" and hash_engine.has_holes(filepath):
+        backend = "readinto"  # Mapping would fault in every hole; readinto skips them
+    elif tuned and backend == "auto":
+        backend = tuned["backend"]
+    backend = hash_engine.select_backend(filepath, backend)
+    if backend == "mmap":
+        return backend, block_size or DEFAULT_BLOCK_SIZE  # Mapped files are not read in blocks
+    return backend, block_size or (tuned["block_size"] if tuned else DEFAULT_BLOCK_SIZE)
+
+
+def prepare(filepath, st=None):
+    """
+    Probe the file's device now if it is large enough and not tuned yet.
+
+    Worker processes that read the file later with ``probe=False`` find the
+    result on disk, so several of them never probe the same device at once.
+
+    :param filepath: File about to be handed to a worker
+    :param st: os.stat result of the file, if already known
+    :return: Remembered tuning of the device, or None
+    """
+    try:
+        st = st or os.stat(filepath)
+    except OSError:
+        return None
+    return _tuned_for(filepath, st)
+
+
+def _mount_point(path, dev):
+    """Topmost directory above path that is still on the given device."""
+    path = os.path.abspath(path)
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path or os.stat(parent).st_dev != dev:
+            return path
+        path = parent
+
+
+def _device_key(filepath, st):
+    """
+    Key of the file's file system in the remembered results.
+
+    Device numbers are handed out again after a reboot or remount, so the
+    mount point and file system id are used where statvfs is available.
+    """
+    key = _keys.get(st.st_dev)
+    if key is None:
+        key = str(st.st_dev)
+        if hasattr(os, "statvfs"):
+            try:
+                key = f"{_mount_point(filepath, st.st_dev)} {os.statvfs(filepath).f_fsid:x}"
+            except OSError:
+                pass
+        _keys[st.st_dev] = key
+    return key
+
+
+def _fresh(remembered, device):
+    tuned = remembered.get(device)
+    if tuned and tuned.get("probed", 0) >= time.time() - TUNE_MAX_AGE:
+        return tuned
+    return None
+
+
+def _tuned_for(filepath, st, may_probe=True):
+    """Remembered tuning for the file's device, probing it if needed."""
+    remembered = _load()
+    device = _device_key(filepath, st)
+    tuned = _fresh(remembered, device)
+    if tuned:
+        return tuned
+
+    if not stat.S_ISREG(st.st_mode) or st.st_size < TUNE_MIN_SIZE:
+        return None
+    if not may_probe:
+        return _fresh(_load(refresh=True), device)  # Possibly probed by another process since
+
+    try:
+        throughput = probe(filepath)
+    except (OSError, ValueError):
+        return None
+
+    block_size = pick_block_size(throughput)
+    use_mmap = throughput["mmap"] >= throughput[block_size] * (1 + TIE_MARGIN)
+    remembered[device] = {
+        "backend": "mmap" if use_mmap else "readinto",
+        "block_size": block_size,
+        "throughput": {str(size): round(rate) for size, rate in throughput.items()},
+        "probed": int(time.time()),
+    }
+    _save(remembered)
+    return remembered[device]
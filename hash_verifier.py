@@ -1,12 +1,25 @@
 import os
 import sys
-import hashlib
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
+import queue
 import time
 import re
 import ctypes
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import hash_instance
+from hash_cache import open_cache
+from hash_engine import (ALGORITHMS, DEFAULT_ALGORITHMS, hash_file, normalize_hash, algorithms_for_hash, match_hash,
+                         preferred_algorithms, remaining_algorithms, check_settings)
+from hash_follow import watcher_for
+from hash_index import find_entries
+from hash_manifest import iter_entries
+from hash_profile import HashProfile, describe
+from hash_progress import POLL_INTERVAL, Progress, format_size
+from hash_tuner import read_plan
 
 # DPI Awareness
 try:
@@ -23,7 +36,9 @@ except (AttributeError, OSError):
 # Constants
 WINDOW_WIDTH = 750
 WINDOW_HEIGHT = 800
-BUFFER_SIZE = 65536  # 64KB
+PROGRESS_INTERVAL_MS = int(POLL_INTERVAL * 1000)
+QUEUE_WORKERS = 2  # Files hashed at once when many are opened together
+PROFILE = os.environ.get("HASH_VERIFIER_PROFILE", "1") != "0"  # Collect timings for the details panel
 
 class HashVerifier:
     """
@@ -32,18 +47,36 @@ class HashVerifier:
     and compares them against a user-provided hash.
     """
     
-    def __init__(self, filepath):
+    def __init__(self, filepath, expected_hash=None, follow=False, master=None):
         self.filepath = filepath
-        self.window = tk.Tk()
+        self.master = master
+        self.window = tk.Toplevel(master) if master else tk.Tk()
         self.window.title("Hash Verifier v0.0.1")
         self.window.geometry(f"{WINDOW_WIDTH}x{WINDOW_HEIGHT}")
         self.window.resizable(True, True)
 
         self.hashes = {}
         self.computation_time = 0
+        self.from_cache = False
+        self.stats = {}
+        self.profile = None
+        self.ui_lag_ns = 0
+        self.computing = False
+        self.on_hashes_done = None
+        # Only the first pass follows a growing file; later ones read the finished file
+        self.follow = watcher_for(filepath) if follow else None
+        
+        # A known expected hash only needs the default algorithms matching its length
+        expected_hash = normalize_hash(expected_hash or "")
+        self.algorithms = list(preferred_algorithms(expected_hash)) or list(DEFAULT_ALGORITHMS)
         
         self.setup_gui()
-        self.window.after(100, self.calculate_hashes)
+        
+        if expected_hash:
+            self.verify_entry.insert(0, expected_hash)
+            self.window.after(100, lambda: self.calculate_hashes(on_done=self.verify_hash))
+        else:
+            self.window.after(100, self.calculate_hashes)
     
     def setup_gui(self):
         info_frame = tk.Frame(self.window, padx=10, pady=10)
@@ -66,11 +99,17 @@ class HashVerifier:
         
         tk.Label(hash_frame, text="Hash Values:", font=("Segoe UI", 10, "bold")).pack(anchor=tk.W, pady=(0, 10))
         
-        self.hash_widgets = {}
-        algorithms = ["MD5", "SHA-1", "SHA-256", "SHA-512", "SHA3-256"]
+        # Opt-in algorithms are folded away so the window keeps its size as more are registered
+        extra = [algo for algo in ALGORITHMS if algo not in DEFAULT_ALGORITHMS]
+        self.more_frame = tk.Frame(hash_frame)
+        self.more_btn = tk.Button(hash_frame, text="More algorithms", relief=tk.FLAT, fg="#0066cc",
+                                  font=("Segoe UI", 8), command=self.toggle_more)
+        self.more_shown = False
         
-        for algo in algorithms:
-            row_frame = tk.Frame(hash_frame)
+        self.hash_widgets = {}
+        self.copy_buttons = {}
+        for algo in ALGORITHMS:
+            row_frame = tk.Frame(self.more_frame if algo in extra else hash_frame)
             row_frame.pack(fill=tk.X, pady=5)
             
             label = tk.Label(row_frame, text=f"{algo}:", font=("Segoe UI", 9, "bold"), width=12, anchor=tk.W)
@@ -83,6 +122,9 @@ class HashVerifier:
             copy_btn.pack(side=tk.LEFT)
             
             self.hash_widgets[algo] = value_entry
+            self.copy_buttons[algo] = copy_btn
+        if extra:
+            self.more_btn.pack(anchor=tk.W)
         
         self.progress_frame = tk.Frame(hash_frame)
         self.progress_frame.pack(fill=tk.X, pady=10)
@@ -95,6 +137,11 @@ class HashVerifier:
         
         self.time_label = tk.Label(hash_frame, text="", font=("Segoe UI", 9), fg="#666666")
         
+        self.details_btn = tk.Button(hash_frame, text="Show details", relief=tk.FLAT, fg="#0066cc",
+                                     font=("Segoe UI", 8), command=self.toggle_details)
+        self.details_label = tk.Label(hash_frame, text="", font=("Courier New", 8), fg="#444444", justify=tk.LEFT)
+        self.details_shown = False
+        
         ttk.Separator(self.window, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=10)
         
         verify_frame = tk.LabelFrame(self.window, text="Verify Hash", padx=10, pady=10, font=("Segoe UI", 9, "bold"))
@@ -121,67 +168,71 @@ class HashVerifier:
         button_frame = tk.Frame(self.window, padx=10, pady=10)
         button_frame.pack(fill=tk.X)
         
-        close_btn = tk.Button(button_frame, text="Close", width=12, command=self.window.quit)
+        close_btn = tk.Button(button_frame, text="Close", width=12, command=self.close)
         close_btn.pack(side=tk.RIGHT)
     
     def format_filesize(self, size):
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024.0:
-                return f"{size:.2f} {unit}"
-            size /= 1024.0
-        return f"{size:.2f} PB"
+        return format_size(size)
     
-    def calculate_hashes(self):
-        thread = threading.Thread(target=self._calculate_hashes_thread)
+    def calculate_hashes(self, algorithms=None, on_done=None):
+        if self.computing:
+            return
+        self.computing = True
+        self.on_hashes_done = on_done
+        
+        self.time_label.pack_forget()
+        self.details_btn.pack_forget()
+        self.details_label.pack_forget()
+        self.progress_bar.config(value=0)
+        self.progress_label.config(text="Computing hashes...")
+        self.progress_frame.pack(fill=tk.X, pady=10)
+        
+        self.progress = Progress()
+        self.ui_lag_ns = 0
+        thread = threading.Thread(target=self._calculate_hashes_thread, args=(algorithms or self.algorithms,))
         thread.daemon = True
         thread.start()
+        self.polled_ns = time.perf_counter_ns()
+        self.window.after(PROGRESS_INTERVAL_MS, self.poll_progress)
+    
+    def poll_progress(self):
+        if not self.computing:
+            return
+        # How late the event loop ran this callback
+        now = time.perf_counter_ns()
+        self.ui_lag_ns = max(self.ui_lag_ns, now - self.polled_ns - PROGRESS_INTERVAL_MS * 1000000)
+        self.polled_ns = now
+        if self.progress.done:
+            self.progress_label.config(text=f"Computing hashes... {self.progress.describe()}")
+            self.progress_bar.config(value=(self.progress.fraction or 0) * 100)
+        self.window.after(PROGRESS_INTERVAL_MS, self.poll_progress)
 
-    def _calculate_hashes_thread(self):
+    def _calculate_hashes_thread(self, algorithms):
         try:
-            start_time = time.time()
+            start_time = time.perf_counter_ns()
+            self.from_cache = False
+            backend, buffer_size = read_plan(self.filepath)
+            self.stats = {}
+            self.profile = HashProfile() if PROFILE else None
+            options = {"progress": self.progress.update, "backend": backend, "buffer_size": buffer_size,
+                       "stats": self.stats, "profile": self.profile}
 
-            hashers = {
-                'MD5': hashlib.md5(),
-                'SHA-1': hashlib.sha1(),
-                'SHA-256': hashlib.sha256(),
-                'SHA-512': hashlib.sha512(),
-                'SHA3-256': hashlib.sha3_256()
-            }
+            if self.follow:
+                # A partial file must never be looked up in or stored to the cache
+                computed = hash_file(self.filepath, algorithms, follow=self.follow, **options)
+                self.follow = None
+            else:
+                cache = open_cache()
+                if cache:
+                    with cache:
+                        computed = cache.hash_file(self.filepath, algorithms, **options)
+                        self.from_cache = cache.hits > 0
+                else:
+                    computed = hash_file(self.filepath, algorithms, **options)
+            self.hashes.update(computed)
 
-            md5 = hashers['MD5']
-            sha1 = hashers['SHA-1']
-            sha256 = hashers['SHA-256']
-            sha512 = hashers['SHA-512']
-            sha3_256 = hashers['SHA3-256']
-            
-            filesize = os.path.getsize(self.filepath)
-            bytes_read = 0
-            
-            with open(self.filepath, 'rb') as f:
-                while True:
-                    data = f.read(BUFFER_SIZE)
-                    if not data:
-                        break
-                    
-                    md5.update(data)
-                    sha1.update(data)
-                    sha256.update(data)
-                    sha512.update(data)
-                    sha3_256.update(data)
-                    
-                    bytes_read += len(data)
-                    progress = (bytes_read / filesize) * 100
-                    self.window.after(0, lambda p=progress: self.progress_bar.config(value=p))
-            
-            end_time = time.time()
-            self.computation_time = end_time - start_time
-            self.hashes = {
-                "MD5": md5.hexdigest(),
-                "SHA-1": sha1.hexdigest(),
-                "SHA-256": sha256.hexdigest(),
-                "SHA-512": sha512.hexdigest(),
-                "SHA3-256": sha3_256.hexdigest()
-            }
+            end_time = time.perf_counter_ns()
+            self.computation_time = (end_time - start_time) / 1e9
             
             self.window.after(0, self.display_hashes)
         
@@ -202,14 +253,58 @@ class HashVerifier:
             entry.insert(0, hash_value)
             entry.config(state="readonly")
         
+        for algo, copy_btn in self.copy_buttons.items():
+            copy_btn.config(text="Copy" if algo in self.hashes else "Compute")
+        if not self.more_shown and any(algo not in DEFAULT_ALGORITHMS for algo in self.hashes):
+            self.toggle_more()
+        
         time_text = f"Computed in {self.computation_time:.2f} seconds"
+        if self.from_cache:
+            time_text += " (cached)"
+        if self.stats.get("sparse_bytes"):
+            time_text += f", {format_size(self.stats['sparse_bytes'])} of holes skipped"
         self.time_label.config(text=time_text)
         self.time_label.pack(anchor=tk.W, pady=(5, 0))
         
+        if self.profile is not None and self.profile.wall_ns:
+            lines = describe(self.profile.as_dict())
+            lines.append(f"UI event loop: {max(self.ui_lag_ns, 0) / 1000000:.1f} ms worst delay")
+            self.details_label.config(text="\n".join(lines))
+            self.details_btn.pack(anchor=tk.W)
+            if self.details_shown:
+                self.details_label.pack(anchor=tk.W)
+        
         self.verify_btn.config(state=tk.NORMAL)
         self.load_file_btn.config(state=tk.NORMAL)
+        
+        self.computing = False
+        on_done, self.on_hashes_done = self.on_hashes_done, None
+        if on_done:
+            on_done()
+    
+    def toggle_more(self):
+        self.more_shown = not self.more_shown
+        if self.more_shown:
+            self.more_btn.config(text="Fewer algorithms")
+            self.more_frame.pack(fill=tk.X, after=self.more_btn)
+        else:
+            self.more_btn.config(text="More algorithms")
+            self.more_frame.pack_forget()
     
+    def toggle_details(self):
+        self.details_shown = not self.details_shown
+        if self.details_shown:
+            self.details_btn.config(text="Hide details")
+            self.details_label.pack(anchor=tk.W)
+        else:
+            self.details_btn.config(text="Show details")
+            self.details_label.pack_forget()
+        
     def copy_hash(self, algorithm):
+        if algorithm not in self.hashes:
+            self.calculate_hashes([algorithm])  # Skipped up front, compute on request
+            return
+        
         hash_value = self.hashes.get(algorithm, "")
         if hash_value:
             self.window.clipboard_clear()
@@ -219,33 +314,55 @@ class HashVerifier:
     def load_hash_from_file(self):
         file_path = filedialog.askopenfilename(
             title="Select hash file",
-            filetypes=[("Text files", "*.txt *.md5 *.sha1 *.sha256 *.sha512"), ("All files", "*.*")]
+            filetypes=[("Text files", "*.txt *.md5 *.sha1 *.sha256 *.sha512 *SUMS"), ("All files", "*.*")]
         )
         
         if not file_path:
             return
         
+        # Indexing a large checksum list takes seconds; keep the window responsive meanwhile
+        self.load_file_btn.config(state=tk.DISABLED)
+        self.result_label.config(text="Searching hash file...", fg="#666666")
+        thread = threading.Thread(target=self._load_hash_thread, args=(file_path, set(self.hashes)))
+        thread.daemon = True
+        thread.start()
+    
+    def _load_hash_thread(self, file_path, computed):
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read(1024)  # Read first 1KB
-                
-            hex_pattern = r'\b[a-fA-F0-9]{32,128}\b'
-            match = re.search(hex_pattern, content)
+            # Checksum lists name their files; use the line for this one
+            entries = find_entries(file_path, self.filepath)
+            # Prefer a digest that is already computed
+            entry = next((e for e in entries if e.algorithm in computed), entries[0] if entries else None)
+            hash_value = entry.digest if entry else None
             
-            if match:
-                hash_value = match.group(0)
-                self.verify_entry.delete(0, tk.END)
-                self.verify_entry.insert(0, hash_value)
-                self.verify_hash()  # Auto-verify
-            else:
-                messagebox.showerror("Error", "No valid hash found in file.")
-                
+            # A list of several files that does not name this one has nothing for it; anything
+            # else (a single digest, "SHA256: <hex>", a short note) gets the first hex run
+            if hash_value is None and len(list(islice(iter_entries(file_path), 2))) < 2:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read(1024)  # Read first 1KB
+                match = re.search(r'\b[a-fA-F0-9]{32,128}\b', content)
+                hash_value = match and match.group(0)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to read file:\n{str(e)}")
+            error = str(e)
+            self.window.after(0, lambda: self.hash_loaded(None, error))
+            return
+        self.window.after(0, lambda: self.hash_loaded(hash_value))
+    
+    def hash_loaded(self, hash_value, error=None):
+        self.load_file_btn.config(state=tk.NORMAL)
+        self.result_label.config(text="")
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to read file:\n{error}")
+        elif hash_value:
+            self.verify_entry.delete(0, tk.END)
+            self.verify_entry.insert(0, hash_value)
+            self.verify_hash()  # Auto-verify
+        else:
+            name = os.path.basename(self.filepath)
+            messagebox.showerror("Error", f"No hash for {name} found in file.")
 
     def verify_hash(self):
-        expected_hash = self.verify_entry.get().strip().lower()
-        expected_hash = re.sub(r'[\s:\-]', '', expected_hash)
+        expected_hash = normalize_hash(self.verify_entry.get())
         
         if not expected_hash:
             self.result_label.config(text="⚠ Please enter a hash to compare", fg="#ff6600")
@@ -255,58 +372,228 @@ class HashVerifier:
             self.result_label.config(text="⚠ Invalid hash format (must be hexadecimal)", fg="#ff6600")
             return
         
-        hash_length = len(expected_hash)
-        
-        algo_map = {
-            32: "MD5",
-            40: "SHA-1",
-            64: ("SHA-256", "SHA3-256"),
-            128: "SHA-512"
-        }
+        candidates = algorithms_for_hash(expected_hash)
         
-        detected_algo = algo_map.get(hash_length)
-        
-        if not detected_algo:
+        if not candidates:
             self.result_label.config(text="⚠ Invalid hash length", fg="#ff6600")
             return
         
-        if isinstance(detected_algo, tuple):
-            for algo in detected_algo:
-                actual_hash = self.hashes.get(algo, "").lower()
-                if expected_hash == actual_hash:
-                    self.result_label.config(text=f"✓ Match! ({algo})", fg="#00aa00")
-                    return
-            self.result_label.config(text=f"✗ No Match (compared as SHA-256/SHA3-256)", fg="#cc0000")
+        # Opt-in digests of the same length are only computed if no default one matches
+        missing = [algo for algo in preferred_algorithms(expected_hash) if algo not in self.hashes]
+        matched_algo = match_hash(expected_hash, self.hashes)
+        if not missing and not matched_algo:
+            missing = remaining_algorithms(expected_hash, self.hashes)
+        if missing and not matched_algo:
+            self.result_label.config(text="Computing...", fg="#666666")
+            self.calculate_hashes(missing, on_done=self.verify_hash)
+            return
+        
+        if matched_algo:
+            self.result_label.config(text=f"✓ Match! ({matched_algo})", fg="#00aa00")
         else:
-            actual_hash = self.hashes.get(detected_algo, "").lower()
-            if expected_hash == actual_hash:
-                self.result_label.config(text=f"✓ Match! ({detected_algo})", fg="#00aa00")
-            else:
-                self.result_label.config(text=f"✗ No Match (compared as {detected_algo})", fg="#cc0000")
+            compared_as = "/".join(candidates)
+            self.result_label.config(text=f"✗ No Match (compared as {compared_as})", fg="#cc0000")
 
     def show_error(self, error_msg):
         self.progress_frame.pack_forget()
         messagebox.showerror("Error", f"Failed to calculate hashes:\n{error_msg}")
-        self.window.quit()
+        self.close()
+    
+    def close(self):
+        if self.master:
+            self.window.destroy()
+        else:
+            self.window.quit()
     
     def run(self):
         self.window.mainloop()
 
 
+class HashQueue:
+    """
+    HashQueue lists files handed over by later launches in one window.
+    
+    A small thread pool hashes them so that a large multi-select does not
+    start hundreds of competing disk readers. Double-click a row to open
+    the full view of a file.
+    """
+    
+    def __init__(self, master, workers=QUEUE_WORKERS):
+        self.master = master
+        self.window = tk.Toplevel(master)
+        self.window.title("Hash Verifier - Queue")
+        self.window.geometry(f"{WINDOW_WIDTH}x{WINDOW_HEIGHT // 2}")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        self.jobs = {}  # Row id -> job state, written by the workers
+        self.shown = {}  # Row id -> last displayed status
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        
+        self.tree = ttk.Treeview(self.window, columns=("size", "status", "hash"))
+        self.tree.heading("#0", text="File")
+        self.tree.heading("size", text="Size")
+        self.tree.heading("status", text="Status")
+        self.tree.heading("hash", text="SHA-256")
+        self.tree.column("#0", width=200)
+        self.tree.column("size", width=80, anchor=tk.E)
+        self.tree.column("status", width=140)
+        self.tree.column("hash", width=300)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.tree.bind("<Double-1>", self.open_selected)
+        
+        self.window.after(PROGRESS_INTERVAL_MS, self.poll_jobs)
+    
+    def add(self, filepath, expected_hash=None, follow=False):
+        for iid, job in self.jobs.items():
+            if job["path"] == filepath:
+                self.tree.selection_set(iid)  # Opened twice, show the existing row
+                return
+        
+        try:
+            size = format_size(os.path.getsize(filepath))
+        except OSError:
+            size = ""
+        iid = self.tree.insert("", tk.END, text=os.path.basename(filepath), values=(size, "Queued", ""))
+        self.jobs[iid] = {
+            "path": filepath,
+            "expected": normalize_hash(expected_hash or ""),
+            "follow": follow,
+            "progress": Progress(),
+            "hashes": None,
+            "error": None,
+        }
+        self.pool.submit(self._hash_job, self.jobs[iid])
+    
+    def _hash_job(self, job):
+        try:
+            expected = job["expected"]
+            algorithms = list(preferred_algorithms(expected)) or list(DEFAULT_ALGORITHMS)
+            backend, buffer_size = read_plan(job["path"])
+            options = {"progress": job["progress"].update, "backend": backend, "buffer_size": buffer_size}
+            
+            cache = None if job["follow"] else open_cache()  # One connection per worker thread
+            try:
+                if job["follow"]:
+                    hashes = hash_file(job["path"], algorithms, follow=watcher_for(job["path"]), **options)
+                else:
+                    hashes = (cache.hash_file if cache else hash_file)(job["path"], algorithms, **options)
+                # Opt-in digests of the same length only if no default one matched
+                remaining = remaining_algorithms(expected, hashes) if expected else []
+                if remaining and not match_hash(expected, hashes):
+                    hashes.update((cache.hash_file if cache else hash_file)(job["path"], remaining, **options))
+            finally:
+                if cache:
+                    cache.close()
+            job["hashes"] = hashes
+        except Exception as e:
+            job["error"] = e.strerror if isinstance(e, OSError) and e.strerror else str(e)
+    
+    def describe(self, job):
+        if job["error"]:
+            return f"Error: {job['error']}", ""
+        if job["hashes"] is None:
+            if not job["progress"].done:
+                return "Queued", ""
+            return f"Hashing {(job['progress'].fraction or 0) * 100:.0f}%", ""
+        
+        digest = job["hashes"].get("SHA-256", "")
+        if not job["expected"]:
+            return "Done", digest
+        matched_algo = match_hash(job["expected"], job["hashes"])
+        if matched_algo:
+            return f"✓ Match ({matched_algo})", job["hashes"][matched_algo]
+        return "✗ No Match", digest
+    
+    def poll_jobs(self):
+        if not self.window.winfo_exists():
+            return
+        for iid, job in self.jobs.items():
+            status = self.describe(job)
+            if self.shown.get(iid) != status:
+                self.tree.set(iid, "status", status[0])
+                self.tree.set(iid, "hash", status[1])
+                self.shown[iid] = status
+        self.window.after(PROGRESS_INTERVAL_MS, self.poll_jobs)
+    
+    def open_selected(self, event=None):
+        for iid in self.tree.selection():
+            job = self.jobs[iid]
+            if os.path.isfile(job["path"]):
+                HashVerifier(job["path"], job["expected"] or None, master=self.master)
+    
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.window.destroy()
+
+
+def run_instance(server, filepath, expected_hash=None, follow=False):
+    """
+    Show the first file and collect files forwarded by later launches.
+    
+    The hidden root window lives until the last visible window is closed.
+    """
+    root = tk.Tk()
+    root.withdraw()
+    HashVerifier(filepath, expected_hash, follow, master=root)
+    
+    inbox = queue.Queue()
+    server.start(inbox.put)
+    file_queue = None
+    
+    def poll_inbox():
+        nonlocal file_queue
+        while not inbox.empty():
+            for request in inbox.get():
+                if file_queue is None or not file_queue.window.winfo_exists():
+                    file_queue = HashQueue(root)
+                file_queue.add(request["path"], request.get("expected"), bool(request.get("follow")))
+        if not root.winfo_children():
+            root.quit()
+            return
+        root.after(PROGRESS_INTERVAL_MS, poll_inbox)
+    
+    root.after(PROGRESS_INTERVAL_MS, poll_inbox)
+    root.mainloop()
+    server.close()
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        messagebox.showerror("Error", "No file selected.\n\nUsage: HashVerifier.exe <filepath>")
+    # --follow keeps hashing while the file is still being written,
+    # --new-window opts out of handing the file to a running instance
+    follow = "--follow" in sys.argv[1:]
+    new_window = "--new-window" in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg not in ("--follow", "--new-window")]
+
+    try:
+        check_settings()
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        sys.exit(1)
+
+    if not args:
+        messagebox.showerror("Error", "No file selected.\n\nUsage: HashVerifier.exe [--follow] [--new-window] <filepath> [expected hash]")
         sys.exit(1)
     
-    filepath = sys.argv[1]
+    filepath = args[0]
     
     if not os.path.exists(filepath):
         messagebox.showerror("Error", f"File not found:\n{filepath}")
         sys.exit(1)
     
     if os.path.isdir(filepath):
-        messagebox.showerror("Error", "Folders are not supported.\nPlease select a file.")
+        messagebox.showerror("Error", "Folders are not supported.\nPlease select a file, or use\n'hashverify batch' to hash a folder.")
         sys.exit(1)
     
-    app = HashVerifier(filepath)
+    expected_hash = args[1] if len(args) > 1 else None
+    
+    server = None if new_window else hash_instance.claim()
+    if server:
+        run_instance(server, filepath, expected_hash, follow)
+        sys.exit(0)
+    
+    request = {"path": os.path.abspath(filepath), "expected": expected_hash, "follow": follow}
+    if not new_window and hash_instance.forward([request]):
+        sys.exit(0)
+    
+    app = HashVerifier(filepath, expected_hash, follow)
     app.run()
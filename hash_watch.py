@@ -0,0 +1,294 @@
+"""
+Watch mode for Hash Verifier: keep a directory's manifests up to date.
+
+The watcher remembers the stat identity and digests of every file below a
+directory. When something changes, only the files whose size, modification
+time or inode differ are hashed again, drift against the manifest is
+reported, and the manifests are rewritten atomically.
+
+Changes are picked up through inotify on Linux and by periodically
+re-scanning the tree everywhere else. With the digest cache enabled, the
+initial scan after a restart only reads files changed in the meantime.
+"""
+import os
+import sys
+import stat
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import collections
+
+import hash_batch
+import hash_cache
+import hash_engine
+import hash_manifest
+
+# Constants
+POLL_INTERVAL = 5.0  # Seconds between scans without inotify
+SETTLE_TIME = 1.0  # Seconds without events before changed files are hashed
+
+# Drift kinds
+ADDED = "ADDED"
+CHANGED = "CHANGED"
+REMOVED = "REMOVED"
+UNREADABLE = "UNREADABLE"
+
+Drift = collections.namedtuple("Drift", "kind name path old new error")
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")
+
+
+class PollingSource:
+    """Report a full re-scan every ``interval`` seconds."""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+
+    def __iter__(self):
+        while True:
+            time.sleep(self.interval)
+            yield None
+
+    def close(self):
+        pass
+
+
+class InotifySource:
+    """
+    Report changed paths below a directory through Linux inotify.
+
+    Iterating yields sets of changed paths once events have settled, or
+    None when the kernel queue overflowed and a full re-scan is needed.
+    """
+
+    def __init__(self, directory, settle=SETTLE_TIME):
+        """
+        :param directory: Directory to watch recursively
+        :param settle: Seconds without events before a batch is reported
+        :raise OSError: If inotify is not available
+        """
+        self.settle = settle
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.fd = fd
+        self.directories = {}  # Watch descriptor -> directory path
+        self.add_tree(directory)
+
+    def add_tree(self, directory):
+        """Watch a directory and every directory below it."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code == errno.ENOSPC:
+                raise OSError(code, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            return  # Vanished or unreadable, the re-scan reports it
+        self.directories[wd] = directory
+        try:
+            with os.scandir(directory) as it:
+                subdirectories = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            return
+        for subdirectory in subdirectories:
+            self.add_tree(subdirectory)
+
+    def _read(self, timeout):
+        """Read pending events into a set of paths, None on overflow."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        data = os.read(self.fd, 64 * 1024)
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None:
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_tree(path)
+            paths.add(path)
+        return paths
+
+    def __iter__(self):
+        while True:
+            changed = self._read(None)
+            # Keep collecting until the writers are quiet for a moment
+            while changed is not None:
+                more = self._read(self.settle)
+                if not more:
+                    break
+                changed |= more
+            yield changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_source(directory, poll=False, interval=POLL_INTERVAL):
+    """
+    Pick the change source for a directory.
+
+    :param directory: Directory to watch
+    :param poll: Force the polling fallback
+    :param interval: Seconds between scans when polling
+    :return: InotifySource or PollingSource
+    """
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifySource(directory)
+        except (OSError, AttributeError):
+            pass  # No usable inotify, e.g. some network file systems or containers
+    return PollingSource(interval)
+
+
+def _order(path):
+    return path.split(os.sep)  # Same order as hash_batch.iter_files
+
+
+class ManifestWatcher:
+    """
+    Keep the checksum manifests of a directory in sync with its files.
+
+    The current manifests are loaded first and act as the reference for
+    drift; ``sync`` then re-hashes what changed and rewrites them.
+    """
+
+    def __init__(self, directory, algorithms, cache=None, workers=None):
+        """
+        :param directory: Directory whose files are listed in the manifests
+        :param algorithms: Algorithm names, one manifest each
+        :param cache: Optional hash_cache.DigestCache
+        :param workers: Number of worker processes for re-hashing
+        """
+        self.directory = directory
+        self.algorithms = list(algorithms)
+        self.cache = cache
+        self.workers = workers
+        self.state = {}  # Path -> (stat key, {algorithm: digest})
+
+        # Manifests of every algorithm are left out, not only the ones maintained here
+        manifests = {algo: os.path.join(directory, hash_batch.manifest_name(algo)) for algo in hash_engine.SUM_TAGS}
+        self.skip = {os.path.normpath(path + suffix) for path in manifests.values() for suffix in ("", ".tmp")}
+        for algo in self.algorithms:
+            if os.path.isfile(manifests[algo]):
+                self._load(manifests[algo])
+
+    def _load(self, manifest):
+        for entry in hash_manifest.iter_entries(manifest):
+            if entry.algorithm not in self.algorithms:
+                continue
+            path = os.path.normpath(os.path.join(self.directory, entry.name))
+            self.state.setdefault(path, (None, {}))[1][entry.algorithm] = entry.digest
+
+    def _candidates(self, paths):
+        """Files to compare: everything on disk or known below the given paths."""
+        if paths is None:
+            paths = [self.directory]
+        found = set()
+        for path in paths:
+            path = os.path.normpath(path)
+            if os.path.isdir(path):
+                found.update(os.path.normpath(f) for f in hash_batch.iter_files([path]))
+            elif os.path.isfile(path):
+                found.add(path)
+            prefix = path.rstrip(os.sep) + os.sep
+            found.update(known for known in self.state if known == path or known.startswith(prefix))
+        return found - self.skip
+
+    def sync(self, paths=None):
+        """
+        Re-hash changed files and rewrite the manifests if anything drifted.
+
+        :param paths: Changed paths to look at, or None to scan everything
+        :return: List of Drift in manifest order
+        """
+        drift = []
+        stale = {}
+        for path in sorted(self._candidates(paths), key=_order):
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+
+            known = self.state.get(path)
+            if st is None or not stat.S_ISREG(st.st_mode):
+                if known:
+                    del self.state[path]
+                    drift.append(self._drift(REMOVED, path, known[1], None))
+            elif known is None or known[0] != hash_cache.stat_key(st):
+                stale[path] = hash_cache.stat_key(st)
+
+        # Lines are also added when a listed file gains a digest for another algorithm
+        dirty = bool(drift)
+        results = hash_batch.hash_files(stale, self.algorithms, workers=self.workers, cache=self.cache)
+        for path, hashes, error in results if stale else ():
+            known = self.state.get(path)
+            old = known[1] if known else None
+            if error:
+                drift.append(self._drift(UNREADABLE, path, old, None, error))
+                continue
+
+            self.state[path] = (stale[path], hashes)
+            if old is None:
+                drift.append(self._drift(ADDED, path, None, hashes))
+            elif any(hashes[algo] != digest for algo, digest in old.items()):
+                drift.append(self._drift(CHANGED, path, old, hashes))
+            dirty = dirty or old is None or len(old) < len(hashes)
+
+        if dirty or any(item.kind != UNREADABLE for item in drift):
+            self.write()
+        drift.sort(key=lambda item: _order(item.path))
+        return drift
+
+    def _drift(self, kind, path, old, new, error=None):
+        return Drift(kind, os.path.relpath(path, self.directory), path, old, new, error)
+
+    def write(self):
+        """Rewrite every manifest atomically from the current state."""
+        with hash_batch.ManifestWriter(self.directory, self.algorithms) as writer:
+            for path in sorted(self.state, key=_order):
+                writer.write(path, self.state[path][1])
+
+    def watch(self, source):
+        """
+        Report drift as it happens, forever.
+
+        An initial full scan compares the tree against the loaded manifests.
+
+        :param source: InotifySource or PollingSource
+        :return: Iterator of lists of Drift, one per processed batch of changes
+        """
+        yield self.sync()
+        for paths in source:
+            yield self.sync(paths)